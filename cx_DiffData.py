@@ -0,0 +1,237 @@
+"""Defines class for comparing the data in two export files."""
+
+import cx_Exceptions
+import cx_ImportData
+import cx_Logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+SPILL_BATCH_SIZE = 1000
+
+class ColumnsDiffer(cx_Exceptions.BaseException):
+    message = "Columns of table %(tableName)s differ between the files."
+
+
+def _DiffPartition(oldFileName, newFileName, resultFileName):
+    """Compare a partition of the old table with the same partition of the
+       new table and write the changes to the result file, returning the
+       number of each kind of change (run in a worker process). Only the rows
+       of the old partition are held in memory."""
+    oldRows = {}
+    for key, row in _ReadPartition(oldFileName):
+        oldRows[key] = row
+    counts = { INSERT : 0, UPDATE : 0, DELETE : 0 }
+    with open(resultFileName, "wb") as resultFile:
+        changes = []
+        for key, row in _ReadPartition(newFileName):
+            oldRow = oldRows.pop(key, None)
+            if oldRow is None:
+                changes.append((INSERT, key, None, row))
+            elif oldRow != row:
+                changes.append((UPDATE, key, oldRow, row))
+            else:
+                continue
+            counts[changes[-1][0]] += 1
+            if len(changes) == SPILL_BATCH_SIZE:
+                pickle.dump(changes, resultFile, pickle.HIGHEST_PROTOCOL)
+                changes = []
+        for key, row in oldRows.items():
+            changes.append((DELETE, key, row, None))
+            counts[DELETE] += 1
+            if len(changes) == SPILL_BATCH_SIZE:
+                pickle.dump(changes, resultFile, pickle.HIGHEST_PROTOCOL)
+                changes = []
+        if changes:
+            pickle.dump(changes, resultFile, pickle.HIGHEST_PROTOCOL)
+    return counts
+
+
+def _ReadPartition(fileName):
+    """Return the entries spilled to the partition file."""
+    with open(fileName, "rb") as inFile:
+        while True:
+            try:
+                entries = pickle.load(inFile)
+            except EOFError:
+                break
+            yield from entries
+
+
+class Differ:
+    """Compares the tables in two export files and returns the rows that were
+       inserted, updated or deleted, identified by the values of the key
+       columns of each table. The rows of both tables are first partitioned
+       by a hash of the key and spilled to temporary files; corresponding
+       partitions are then compared by a pool of worker processes so that
+       only one partition of the old table needs to be held in memory by each
+       worker. The number of partitions should be chosen so that this fits
+       comfortably in memory; changes are returned grouped by partition, not
+       in key order. The pool of worker processes is started once for all of
+       the tables compared by DiffFiles() but once for each call otherwise."""
+
+    def __init__(self, oldFileName, newFileName, numPartitions = 16,
+            numWorkers = None, tempDir = None):
+        self.oldFileName = oldFileName
+        self.newFileName = newFileName
+        self.numPartitions = numPartitions
+        self.numWorkers = numWorkers
+        self.tempDir = tempDir
+        self.counts = {}
+        self.pool = None
+
+    def __OpenTable(self, importer, fileName, tableName):
+        """Position the importer at the start of the named table, returning
+           the column names, or None if the table is not in the file. The
+           index is used if the file has one; otherwise the file is read
+           until the table is found."""
+        importer.OpenFile(fileName)
+        try:
+            return importer.SeekTable(tableName)[1]
+        except cx_ImportData.TableNotFound:
+            return None
+        except cx_ImportData.IndexNotFound:
+            pass
+        for name, columnNames in importer:
+            if name == tableName:
+                return columnNames
+            importer.SkipTable()
+
+    def __Partition(self, importer, keyIndexes, dirName, prefix):
+        """Spill the rows of the table at which the importer is positioned
+           to partition files, returning the names of the files."""
+        fileNames = [os.path.join(dirName, "%s.%d" % (prefix, i)) \
+                for i in range(self.numPartitions)]
+        files = [open(n, "wb") for n in fileNames]
+        try:
+            pending = [[] for f in files]
+            for row in importer.IterRows():
+                key = tuple(row[i] for i in keyIndexes)
+                partitionNum = hash(key) % self.numPartitions
+                entries = pending[partitionNum]
+                entries.append((key, row))
+                if len(entries) == SPILL_BATCH_SIZE:
+                    pickle.dump(entries, files[partitionNum],
+                            pickle.HIGHEST_PROTOCOL)
+                    entries.clear()
+            for entries, outFile in zip(pending, files):
+                if entries:
+                    pickle.dump(entries, outFile, pickle.HIGHEST_PROTOCOL)
+        finally:
+            for outFile in files:
+                outFile.close()
+        return fileNames
+
+    def __StartPool(self):
+        """Start the pool of worker processes."""
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(self.numWorkers)
+
+    def __StopPool(self):
+        """Stop the pool of worker processes."""
+        self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+
+    def __TableNames(self, importer, fileName):
+        """Return the names of the tables in the file."""
+        importer.OpenFile(fileName)
+        try:
+            return [n for n, r in importer.Tables()]
+        except cx_ImportData.IndexNotFound:
+            pass
+        tableNames = []
+        for name, columnNames in importer:
+            tableNames.append(name)
+            importer.SkipTable()
+        return tableNames
+
+    def DiffFiles(self, keyColumns):
+        """Compare all of the tables found in either file for which key
+           columns are specified (a dictionary of table names and lists of
+           column names) and return (tableName, action, key, oldRow, newRow)
+           tuples for each row that differs."""
+        importer = cx_ImportData.Importer(None)
+        tableNames = self.__TableNames(importer, self.oldFileName)
+        for tableName in self.__TableNames(importer, self.newFileName):
+            if tableName not in tableNames:
+                tableNames.append(tableName)
+        tableNames = [n for n in tableNames if n in keyColumns]
+        if not tableNames:
+            return
+        self.__StartPool()
+        try:
+            for tableName in tableNames:
+                for change in self.DiffTable(tableName,
+                        keyColumns[tableName]):
+                    yield (tableName,) + change
+        finally:
+            self.__StopPool()
+
+    def DiffTable(self, tableName, keyColumns, newTableName = None):
+        """Compare the table in the old file with the table (or the table with
+           the new name, if specified) in the new file and return (action,
+           key, oldRow, newRow) tuples for each row that differs; the action
+           is one of INSERT, UPDATE or DELETE and the row that does not exist
+           is None. A table missing from one of the files is treated as
+           empty. The number of each kind of change is stored in the counts
+           attribute once all of the changes have been returned."""
+        if newTableName is None:
+            newTableName = tableName
+        cx_Logging.Trace("Comparing %s...", tableName)
+        importer = cx_ImportData.Importer(None)
+        dirName = tempfile.mkdtemp(dir = self.tempDir)
+        try:
+            partitions = {}
+            columnNames = None
+            for prefix, fileName, name in \
+                    (("old", self.oldFileName, tableName),
+                     ("new", self.newFileName, newTableName)):
+                tableColumnNames = self.__OpenTable(importer, fileName, name)
+                if tableColumnNames is None:
+                    partitions[prefix] = [os.devnull] * self.numPartitions
+                    continue
+                if columnNames is None:
+                    columnNames = tableColumnNames
+                elif tableColumnNames != columnNames:
+                    raise ColumnsDiffer(tableName = tableName)
+                keyIndexes = []
+                for keyColumn in keyColumns:
+                    if keyColumn not in tableColumnNames:
+                        raise cx_ImportData.ColumnNotFound(name = keyColumn,
+                                tableName = name)
+                    keyIndexes.append(tableColumnNames.index(keyColumn))
+                partitions[prefix] = self.__Partition(importer, keyIndexes,
+                        dirName, prefix)
+            importer.Close()
+            args = [(o, n, os.path.join(dirName, "diff.%d" % i)) \
+                    for i, (o, n) in \
+                    enumerate(zip(partitions["old"], partitions["new"]))]
+            self.counts = { INSERT : 0, UPDATE : 0, DELETE : 0 }
+            ownPool = self.pool is None
+            if ownPool:
+                self.__StartPool()
+            try:
+                results = [self.pool.apply_async(_DiffPartition, a) \
+                        for a in args]
+                for (oldFileName, newFileName, resultFileName), result in \
+                        zip(args, results):
+                    for action, numChanges in result.get().items():
+                        self.counts[action] += numChanges
+                    yield from _ReadPartition(resultFileName)
+                    os.remove(resultFileName)
+            finally:
+                if ownPool:
+                    self.__StopPool()
+            cx_Logging.Trace("  %d inserts, %d updates, %d deletes.",
+                    self.counts[INSERT], self.counts[UPDATE],
+                    self.counts[DELETE])
+        finally:
+            importer.Close()
+            shutil.rmtree(dirName)
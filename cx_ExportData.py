@@ -1,51 +1,511 @@
 """Module for use in exporting data to a file."""
 
+import array
+import concurrent.futures
+import cx_Exceptions
+import datetime
+import json
 import cx_Logging
 import cx_Oracle
+import cx_OracleUtils
+import lzma
+import multiprocessing
+import os
 import pickle
+import struct
 import sys
+import tempfile
+import time
+import zlib
 
 # define constant for pickle protocol
 BINARY = 1
 
+# define constant for the pickle protocol used for blocks; protocol 1 stores
+# bytes as latin-1 strings which considerably increases their size
+BLOCK_PROTOCOL = 4
+
+# define constants identifying the columnar (batched) file format
+FORMAT_NAME = "cx_ExportData"
+FORMAT_VERSION = 2
+
+# define constants for the index written at the end of the file; the index
+# is followed by a trailer containing the offset of the index and the magic
+# value that identifies its presence
+INDEX_MAGIC = b"cxExpIdx"
+INDEX_TRAILER = struct.Struct("<Q8s")
+
+# define constants for how column values are stored in a block
+STORAGE_STRING = "S"
+STORAGE_BINARY = "B"
+
+# define the types that are stored as length prefixed values in a block
+STRING_TYPES = ("STRING", "FIXED_CHAR", "NCHAR", "FIXED_NCHAR", "ROWID",
+        "LONG_STRING")
+BINARY_TYPES = ("BINARY", "LONG_BINARY")
+
+# define the types whose values are not fetched with the row but read from a
+# locator (or, for LONG columns, are of unknown size)
+LOB_TYPES = (cx_Oracle.BLOB, cx_Oracle.CLOB, cx_Oracle.NCLOB,
+        cx_Oracle.LONG_BINARY, cx_Oracle.LONG_STRING)
+
+# define the types whose values can be streamed in chunks and the default
+# size of each chunk
+STREAMED_TYPES = ("BLOB", "CLOB", "NCLOB")
+LOB_CHUNK_SIZE = 1024 * 1024
+
+# define the codecs available for compressing blocks; each entry is a tuple
+# of the function used to compress and the function used to decompress
+CODECS = {
+        "lzma" : (lzma.compress, lzma.decompress),
+        "zlib" : (zlib.compress, zlib.decompress)
+}
+
+# define constants for the kinds of column buffers written by the
+# ColumnBufferExporter; fixed width kinds are mapped to their array type code
+# and variable width kinds are stored as offsets and data
+BUFFER_INT64 = "int64"
+BUFFER_FLOAT64 = "float64"
+BUFFER_DATETIME = "datetime"
+BUFFER_STRING = "string"
+BUFFER_BINARY = "binary"
+BUFFER_TYPE_CODES = {
+        BUFFER_INT64 : "q",
+        BUFFER_FLOAT64 : "d",
+        BUFFER_DATETIME : "q"
+}
+BUFFER_ALIGNMENT = 8
+
+# define the size of each read when copying buffers from the spool file
+COPY_SIZE = 1024 * 1024
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# define the cursor used by each worker process of a parallel export
+_workerCursor = None
+
+
+class LobStreamingNotSupported(cx_Exceptions.BaseException):
+    message = "LOB values can only be streamed in the original format."
+
+
+class UnknownCodec(cx_Exceptions.BaseException):
+    message = 'Codec "%(name)s" is not registered.'
+
+
+def LobChunks(lob, chunkSize = LOB_CHUNK_SIZE):
+    """Return the contents of the LOB in chunks of the given size so that
+       the entire value never needs to be held in memory."""
+    offset = 1
+    while True:
+        chunk = lob.read(offset, chunkSize)
+        if not chunk:
+            break
+        yield chunk
+        offset += len(chunk)
+
+
+def ColumnStorage(dataType):
+    """Return the storage used for the column type (as written in the column
+       list of a table) when stored in a block or None if the values are
+       stored as is."""
+    dataType = dataType.split(",")[0]
+    if dataType in STRING_TYPES:
+        return STORAGE_STRING
+    elif dataType in BINARY_TYPES:
+        return STORAGE_BINARY
+
+
+def Codec(name):
+    """Return the compress and decompress functions for the codec."""
+    functions = CODECS.get(name)
+    if functions is None:
+        raise UnknownCodec(name = name)
+    return functions
+
+
+def DecodeColumn(storage, data):
+    """Return the list of values for the column stored in a block."""
+    if storage is None:
+        return data
+    lengthData, valueData = data
+    lengths = array.array("i")
+    lengths.frombytes(lengthData)
+    if sys.byteorder != "little":
+        lengths.byteswap()
+    values = []
+    offset = 0
+    for length in lengths:
+        if length < 0:
+            values.append(None)
+            continue
+        value = valueData[offset:offset + length]
+        offset += length
+        if storage == STORAGE_STRING:
+            value = value.decode("utf-8")
+        values.append(value)
+    return values
+
+
+def EncodeColumn(storage, values):
+    """Return the values for the column encoded for storage in a block;
+       strings are stored as an array of lengths (-1 for null) followed by
+       the data for all of the values concatenated together. Values of string
+       columns which are not strings (such as numbers, if the cursor does not
+       return them as strings) are converted to strings first."""
+    if storage is None:
+        return values
+    lengths = array.array("i")
+    parts = []
+    for value in values:
+        if value is None:
+            lengths.append(-1)
+            continue
+        if storage == STORAGE_STRING:
+            if not isinstance(value, str):
+                value = str(value)
+            value = value.encode("utf-8")
+        lengths.append(len(value))
+        parts.append(value)
+    if sys.byteorder != "little":
+        lengths.byteswap()
+    return lengths.tobytes(), b"".join(parts)
+
+
+def RegisterCodec(name, compressFunc, decompressFunc):
+    """Register a codec for compressing the blocks of an export file. Each
+       function accepts a bytes object and returns a bytes object."""
+    CODECS[name] = (compressFunc, decompressFunc)
+
+
+def _ExportSegment(tableName, fileName, reportPoint, columnar, codec,
+        rangeClause, rangeArgs, asOfScn):
+    """Export the table (or the range of rows in the table) to its own
+       segment file (run in a worker process)."""
+    with open(fileName, "wb") as outFile:
+        exporter = Exporter(outFile, _workerCursor, reportPoint,
+                "[%s] " % os.path.basename(fileName), columnar, codec,
+                asOfScn = asOfScn)
+        exporter.ExportTable(tableName, rangeClause = rangeClause,
+                rangeArgs = rangeArgs)
+        exporter.FinalizeExport()
+    return exporter.metrics
+
+
+def _InitializeWorker(connectString, codec, codecFunctions):
+    """Establish the connection used by a worker process and register the
+       codec in use, if any, since codecs registered in the parent process
+       are not registered in processes that are spawned."""
+    global _workerCursor
+    if codec is not None:
+        RegisterCodec(codec, *codecFunctions)
+    connection = cx_OracleUtils.Connect(connectString)
+    _workerCursor = connection.cursor()
+
+
+class ColumnBuffer:
+    """Accumulates the values of a column in a temporary spool file so that
+       they can be written to the export file as contiguous buffers. The
+       spool file is shared by all of the columns of the table; each buffer is
+       recorded as the list of (offset, length) segments of the spool file
+       written for each batch of rows."""
+
+    def __init__(self, name, dataType, kind, spoolFile):
+        self.name = name
+        self.dataType = dataType
+        self.kind = kind
+        self.spoolFile = spoolFile
+        self.nulls = []
+        self.values = []
+        self.data = None
+        self.dataSize = 0
+        if kind not in BUFFER_TYPE_CODES:
+            self.data = []
+            self.__WriteArray(self.values, "q", [0])
+
+    def __Spool(self, segments, data):
+        """Append the data to the spool file and to the buffer made up of the
+           given segments."""
+        if data:
+            segments.append((self.spoolFile.tell(), len(data)))
+            self.spoolFile.write(data)
+
+    def __WriteArray(self, segments, typeCode, values):
+        """Append the values to the buffer in little endian order."""
+        values = array.array(typeCode, values)
+        if sys.byteorder != "little":
+            values.byteswap()
+        self.__Spool(segments, values.tobytes())
+
+    def __WriteBuffer(self, outFile, position, segments):
+        """Write the buffer to the export file, padded so that the next buffer
+           is aligned, and return its offset and length and the position of
+           the next buffer."""
+        length = 0
+        for offset, segmentLength in segments:
+            self.spoolFile.seek(offset)
+            while segmentLength > 0:
+                data = self.spoolFile.read(min(segmentLength, COPY_SIZE))
+                outFile.write(data)
+                segmentLength -= len(data)
+                length += len(data)
+        padding = -length % BUFFER_ALIGNMENT
+        outFile.write(b"\0" * padding)
+        return (position, length), position + length + padding
+
+    def Append(self, values):
+        """Append the values to the buffers."""
+        self.__Spool(self.nulls, bytes(v is None for v in values))
+        if self.kind == BUFFER_DATETIME:
+            values = [0 if v is None else (v - EPOCH) // \
+                    datetime.timedelta(microseconds = 1) for v in values]
+        typeCode = BUFFER_TYPE_CODES.get(self.kind)
+        if typeCode is not None:
+            values = [0 if v is None else v for v in values]
+            self.__WriteArray(self.values, typeCode, values)
+            return
+        offsets = []
+        spoolOffset = self.spoolFile.tell()
+        startSize = self.dataSize
+        for value in values:
+            if value is not None:
+                if isinstance(value, cx_Oracle.LOB):
+                    for chunk in LobChunks(value):
+                        if isinstance(chunk, str):
+                            chunk = chunk.encode("utf-8")
+                        self.spoolFile.write(chunk)
+                        self.dataSize += len(chunk)
+                else:
+                    if not isinstance(value, (str, bytes)):
+                        value = str(value)
+                    if isinstance(value, str):
+                        value = value.encode("utf-8")
+                    self.spoolFile.write(value)
+                    self.dataSize += len(value)
+            offsets.append(self.dataSize)
+        if self.dataSize > startSize:
+            self.data.append((spoolOffset, self.dataSize - startSize))
+        self.__WriteArray(self.values, "q", offsets)
+
+    def Write(self, outFile, position):
+        """Write the buffers to the export file at the given position and
+           return the description of the column and the position following
+           the buffers."""
+        buffers = {}
+        buffers["nulls"], position = self.__WriteBuffer(outFile, position,
+                self.nulls)
+        if self.data is None:
+            buffers["values"], position = self.__WriteBuffer(outFile,
+                    position, self.values)
+        else:
+            buffers["offsets"], position = self.__WriteBuffer(outFile,
+                    position, self.values)
+            buffers["data"], position = self.__WriteBuffer(outFile,
+                    position, self.data)
+        column = dict(name = self.name, type = self.dataType,
+                kind = self.kind, buffers = buffers)
+        return column, position
+
+
 class Exporter:
-    """Export data from a database in a cross platform manner."""
+    """Export data from a database in a cross platform manner, optionally in
+       the columnar format, compressed, incrementally or as of an SCN."""
 
-    def __init__(self, outFile, cursor, reportPoint, prefix = ""):
+    def __init__(self, outFile, cursor, reportPoint, prefix = "",
+            columnar = False, codec = None, sinceScn = None,
+            asOfScn = None):
         self.outFile = outFile
         self.cursor = cursor
         self.cursor.numbersAsStrings = True
         self.reportPoint = reportPoint
         self.prefix = prefix
+        self.columnar = columnar or codec is not None \
+                or sinceScn is not None
+        self.codec = codec
+        self.sinceScn = sinceScn
+        self.asOfScn = asOfScn
+        self.scn = None
+        self.watermarks = {}
+        self.metrics = []
+        self.tableMetrics = None
+        self.metricsFunc = None
+        self.metricsFileName = None
+        self.maxFetchMemory = 8 * 1024 * 1024
+        self.minArraySize = 50
+        self.maxArraySize = 50000
+        self.lobFetchSize = 1024 * 1024
+        self.lobChunkSize = None
+        self.pipelined = False
+        self.pipelineDepth = 4
+        self.tableColumns = []
+        self.compressFunc = None
+        self.columnStorage = []
+        self.index = None
+        if outFile is not None and outFile.seekable():
+            self.index = []
+        if codec is not None:
+            self.compressFunc, decompressFunc = Codec(codec)
+        if sinceScn is not None:
+            self.scn = asOfScn
+            if self.scn is None:
+                self.scn = self.CurrentScn()
+        if self.columnar:
+            header = dict(format = FORMAT_NAME, version = FORMAT_VERSION,
+                    codec = codec)
+            if sinceScn is not None:
+                header["sinceScn"] = sinceScn
+                header["scn"] = self.scn
+            if asOfScn is not None:
+                header["asOfScn"] = asOfScn
+            pickle.dump(header, self.outFile, BINARY)
+
+    def __EncodeBlock(self, rows):
+        """Return the block (number of rows and encoded columns) for the rows
+           fetched from the cursor. If a codec is in use the block is pickled
+           and compressed on its own so that it can be decompressed without
+           reference to any other block."""
+        columns = zip(*rows)
+        block = len(rows), [EncodeColumn(s, v) \
+                for s, v in zip(self.columnStorage, columns)]
+        if self.compressFunc is not None:
+            block = self.compressFunc(pickle.dumps(block, BLOCK_PROTOCOL))
+        return block
+
+    def __ExportRowsSingly(self, rows):
+        """Export the rows to the file, pickling and writing each row before
+           the next one so that the values of the LOB columns of only one row
+           are held in memory at a time."""
+        for row in rows:
+            self.__Write(self.__Serialize(self.__SerializeRows, [row]))
+
+    def __ExportRowsWithLobs(self, rows, lobIndexes):
+        """Export the rows to the file, streaming the values of the LOB
+           columns in chunks after each row."""
+        for row in rows:
+            lobs = [row[i] for i in lobIndexes if row[i] is not None]
+            if lobs:
+                row = list(row)
+                for i in lobIndexes:
+                    if row[i] is not None:
+                        row[i] = row[i].size()
+            self.__Write(pickle.dumps(tuple(row), BINARY))
+            for lob in lobs:
+                for chunk in LobChunks(lob, self.lobChunkSize):
+                    self.__Write(pickle.dumps(chunk, BLOCK_PROTOCOL))
+                self.__Write(pickle.dumps(None, BINARY))
 
-    def __ExportTableHeader(self, tableName):
+    def __ExportBatches(self, rowsToSkip, rowLimit, serializeFunc):
+        """Export the rows in the table to the file, serializing each batch
+           of rows fetched from the database with the given function, and
+           return the number of rows written to the file. Tables with LOB
+           columns are exported in lock-step since the LOB values are read
+           from their locators while the rows are serialized and this cannot
+           be done while the next batch is being fetched."""
+        batches = self._FetchBatches(rowsToSkip, rowLimit)
+        if self.pipelined and not self.__HasLobColumns():
+            return self.__ExportBatchesPipelined(batches, serializeFunc)
+        numWritten = 0
+        for rows in batches:
+            self.__WriteBatch(self.__Serialize(serializeFunc, rows),
+                    len(rows))
+            numWritten += len(rows)
+        return numWritten
+
+    def __ExportBatchesPipelined(self, batches, serializeFunc):
+        """Export the batches of rows to the file with the next batch being
+           fetched and the previous batches being written by other threads
+           while each batch is serialized; return the number of rows written
+           to the file. The generator returning the batches is only ever
+           advanced by one thread at a time."""
+        numWritten = 0
+        pendingWrites = []
+        with concurrent.futures.ThreadPoolExecutor(1) as fetcher, \
+                concurrent.futures.ThreadPoolExecutor(1) as writer:
+            nextRows = fetcher.submit(next, batches, None)
+            while True:
+                rows = nextRows.result()
+                if rows is None:
+                    break
+                nextRows = fetcher.submit(next, batches, None)
+                data = self.__Serialize(serializeFunc, rows)
+                pendingWrites.append(writer.submit(self.__WriteBatch, data,
+                        len(rows)))
+                while len(pendingWrites) > self.pipelineDepth:
+                    pendingWrites.pop(0).result()
+                numWritten += len(rows)
+            for future in pendingWrites:
+                future.result()
+        return numWritten
+
+    def __ExportTableBlocks(self, rowsToSkip, rowLimit):
+        """Export the rows in the table to the file in blocks of columns, one
+           block for each set of rows fetched from the database. The number
+           of rows written to the file is returned."""
+        numWritten = self.__ExportBatches(rowsToSkip, rowLimit,
+                self.__SerializeBlock)
+        self.__Write(pickle.dumps(None, BINARY))
+        return numWritten
+
+    def __ExportTableHeader(self, tableName, rangeClause, rangeArgs,
+            watermarkColumn, since):
         """Export the table header to the file."""
-        cx_Logging.Trace("%sExporting table %s...", self.prefix, tableName)
-        self.cursor.execute("select * from " + tableName)
-        columns = [(r[0], self.__StringRepOfType(r[1], r[2])) \
-                for r in self.cursor.description]
-        pickle.dump(tableName, self.outFile, BINARY)
-        pickle.dump(columns, self.outFile, BINARY)
+        columns = self._ExecuteQuery(tableName, rangeClause, rangeArgs,
+                watermarkColumn, since)
+        self.columnStorage = [ColumnStorage(t) for n, t in columns]
+        self.tableColumns = columns
+        if self.index is not None:
+            self.index.append(dict(name = tableName,
+                    offset = self.outFile.tell(), numRows = 0,
+                    columns = columns, blocks = [],
+                    watermark = self.watermarks.get(tableName)))
+        self.__Write(pickle.dumps(tableName, BINARY) + \
+                pickle.dumps(columns, BINARY))
 
     def __ExportTableRows(self, rowsToSkip, rowLimit):
-        """Export the rows in the table to the file."""
-        numRows = 0
-        format = self.prefix + "  %d rows exported."
-        cursor = self.cursor
-        outFile = self.outFile
-        reportPoint = self.reportPoint
-        for row in cursor:
-            numRows += 1
-            if numRows > rowLimit:
-                numRows -= 1
-                break
-            elif numRows > rowsToSkip:
-                pickle.dump(row, outFile, BINARY)
-            if reportPoint is not None and numRows % reportPoint == 0:
-                cx_Logging.Trace(format, numRows)
-        if reportPoint is None or numRows == 0 or numRows % reportPoint != 0:
-            cx_Logging.Trace(format, numRows)
-        pickle.dump(None, outFile, BINARY)
+        """Export the rows in the table to the file and return the number of
+           rows written to the file. Rows are serialized a batch at a time
+           unless the table has LOB columns; in that case they are serialized
+           one at a time (unless the LOB values are streamed) since pickling
+           a row reads its LOB values in their entirety."""
+        numWritten = 0
+        lobIndexes = []
+        if self.lobChunkSize is not None:
+            lobIndexes = [i for i, (n, t) in enumerate(self.tableColumns) \
+                    if t in STREAMED_TYPES]
+        if lobIndexes:
+            for rows in self._FetchBatches(rowsToSkip, rowLimit):
+                self.__ExportRowsWithLobs(rows, lobIndexes)
+                numWritten += len(rows)
+        elif self.__HasLobColumns():
+            for rows in self._FetchBatches(rowsToSkip, rowLimit):
+                self.__ExportRowsSingly(rows)
+                numWritten += len(rows)
+        else:
+            numWritten = self.__ExportBatches(rowsToSkip, rowLimit,
+                    self.__SerializeRows)
+        self.__Write(pickle.dumps(None, BINARY))
+        return numWritten
+
+    def __HasLobColumns(self):
+        """Return true if the query returns LOB (or LONG) columns."""
+        return any(d[1] in LOB_TYPES for d in self.cursor.description)
+
+    def __Serialize(self, serializeFunc, rows):
+        """Return the rows serialized by the function, recording the time
+           taken in the metrics for the table."""
+        startTime = time.perf_counter()
+        data = serializeFunc(rows)
+        self.tableMetrics["serializeTime"] += time.perf_counter() - startTime
+        return data
+
+    def __SerializeBlock(self, rows):
+        """Return the block for the rows, pickled."""
+        return pickle.dumps(self.__EncodeBlock(rows), BLOCK_PROTOCOL)
+
+    def __SerializeRows(self, rows):
+        """Return the rows, each pickled on its own so that the file is
+           identical to one written a row at a time."""
+        return b"".join([pickle.dumps(r, BINARY) for r in rows])
 
     def __StringRepOfType(self, dataType, displaySize):
         """Return the string representation of the type."""
@@ -61,18 +521,334 @@ class Exporter:
                 return stringRep
         raise Exception("Unsupported type: %s!" % dataType)
 
-    def ExportTable(self, tableName, rowsToSkip = None, rowLimit = None):
-        """Export the data in the table to the file."""
+    def __Write(self, data):
+        """Write the data to the file, recording the time taken and the
+           number of bytes written in the metrics for the table."""
+        startTime = time.perf_counter()
+        self.outFile.write(data)
+        metrics = self.tableMetrics
+        metrics["writeTime"] += time.perf_counter() - startTime
+        metrics["bytes"] += len(data)
+
+    def __WriteBatch(self, data, numRows):
+        """Write the serialized batch of rows to the file, recording the
+           offset of the block in the index if the file is in the columnar
+           format."""
+        if self.columnar and self.index is not None:
+            self.index[-1]["blocks"].append((self.outFile.tell(), numRows))
+        self.__Write(data)
+
+    def _ConfigureFetch(self, sql):
+        """Set the array size for the query from the width of its rows so
+           that each fetch uses no more than maxFetchMemory bytes."""
+        if self.maxFetchMemory is None:
+            return
+        self.cursor.parse(sql)
+        rowWidth = 0
+        minArraySize = self.minArraySize
+        for name, dataType, displaySize, internalSize, precision, scale, \
+                nullOk in self.cursor.description:
+            if dataType in LOB_TYPES:
+                rowWidth += self.lobFetchSize
+                minArraySize = 1
+            else:
+                rowWidth += max(displaySize or 0, internalSize or 0, 8)
+        arraySize = self.maxFetchMemory // max(rowWidth, 1)
+        arraySize = max(minArraySize, min(arraySize, self.maxArraySize))
+        self.cursor.arraysize = arraySize
+        if hasattr(self.cursor, "prefetchrows"):
+            self.cursor.prefetchrows = arraySize
+        cx_Logging.Debug("%s  fetching %d rows at a time (row width %d).",
+                self.prefix, arraySize, rowWidth)
+
+    def _ExecuteQuery(self, tableName, rangeClause, rangeArgs,
+            watermarkColumn = None, since = None):
+        """Execute the query for the table (or range of rows in the table)
+           and return the list of column names and types. If a watermark
+           column is specified, the maximum value of the column is recorded
+           as the new watermark for the table and only rows with values after
+           the previous watermark (if specified) and up to the new watermark
+           are selected."""
+        cx_Logging.Trace("%sExporting table %s...", self.prefix, tableName)
+        conditions = []
+        args = dict(rangeArgs or {})
+        source = tableName
+        if self.asOfScn is not None:
+            source += " as of scn :asOfScn"
+            args["asOfScn"] = self.asOfScn
+        if rangeClause is not None:
+            conditions.append("(%s)" % rangeClause)
+        if self.sinceScn is not None:
+            conditions.append("ora_rowscn > :sinceScn")
+            conditions.append("ora_rowscn <= :scn")
+            args["sinceScn"] = self.sinceScn
+            args["scn"] = self.scn
+        if watermarkColumn is not None:
+            if since is not None:
+                conditions.append("%s > :since" % watermarkColumn)
+                args["since"] = since
+            sql = "select max(%s) from %s" % (watermarkColumn, source)
+            if conditions:
+                sql += " where " + " and ".join(conditions)
+            cursor = self.cursor.connection.cursor()
+            cursor.execute(sql, args)
+            watermark, = cursor.fetchone()
+            if watermark is None:
+                watermark = since
+            else:
+                conditions.append("%s <= :watermark" % watermarkColumn)
+                args["watermark"] = watermark
+            self.watermarks[tableName] = watermark
+        sql = "select * from " + source
+        if conditions:
+            sql += " where " + " and ".join(conditions)
+        startTime = time.perf_counter()
+        self._ConfigureFetch(sql)
+        self.cursor.execute(sql, args)
+        self.tableMetrics["fetchTime"] += time.perf_counter() - startTime
+        return [(r[0], self.__StringRepOfType(r[1], r[2])) \
+                for r in self.cursor.description]
+
+    def _FetchBatches(self, rowsToSkip, rowLimit):
+        """Return the rows to export in batches, one for each set of rows
+           fetched from the database, reporting progress along the way."""
+        numRows = numReported = 0
+        format = self.prefix + "  %d rows exported."
+        cursor = self.cursor
+        reportPoint = self.reportPoint
+        metrics = self.tableMetrics
+        while numRows < rowLimit:
+            startTime = time.perf_counter()
+            rows = cursor.fetchmany()
+            metrics["fetchTime"] += time.perf_counter() - startTime
+            if not rows:
+                break
+            startIndex = max(rowsToSkip - numRows, 0)
+            numRows += len(rows)
+            if numRows > rowLimit:
+                rows = rows[:len(rows) - numRows + rowLimit]
+                numRows = rowLimit
+            rows = rows[startIndex:]
+            if rows:
+                yield rows
+            if reportPoint is not None \
+                    and numRows // reportPoint > numReported // reportPoint:
+                cx_Logging.Trace(format, numRows)
+                numReported = numRows
+        if numRows == 0 or numRows != numReported:
+            cx_Logging.Trace(format, numRows)
+
+    def _FinishMetrics(self, numRows):
+        """Complete the metrics for the table that was exported and pass them
+           to the metrics function, if one is set."""
+        metrics = self.tableMetrics
+        metrics["rows"] = numRows
+        metrics["elapsedTime"] = time.perf_counter() - metrics.pop("start")
+        metrics["rowsPerSecond"] = numRows / max(metrics["elapsedTime"], 1e-6)
+        self.metrics.append(metrics)
+        if self.metricsFunc is not None:
+            self.metricsFunc(metrics)
+
+    def _StartMetrics(self, tableName):
+        """Start collecting the metrics for the table."""
+        self.tableMetrics = dict(name = tableName, rows = 0, bytes = 0,
+                fetchTime = 0.0, serializeTime = 0.0, writeTime = 0.0,
+                start = time.perf_counter())
+
+    def _WriteMetricsSummary(self):
+        """Write the summary of the metrics to the metrics file, if one was
+           specified."""
+        if self.metricsFileName is not None:
+            with open(self.metricsFileName, "w") as outFile:
+                json.dump(self.MetricsSummary(), outFile, indent = 2)
+
+    def CurrentScn(self):
+        """Return the current system change number of the database."""
+        cursor = self.cursor.connection.cursor()
+        return cursor.callfunc("dbms_flashback.get_system_change_number",
+                int)
+
+    def ExportTable(self, tableName, rowsToSkip = None, rowLimit = None,
+            rangeClause = None, rangeArgs = None, watermarkColumn = None,
+            since = None):
+        """Export the data in the table to the file. If a range clause is
+           specified (as returned by TableRanges()) only the rows in that
+           range are exported. If a watermark column (a timestamp or a
+           column populated from a sequence) is specified, only the rows
+           changed since the previous watermark are exported and the new
+           watermark is recorded in the watermarks attribute, in the index
+           entry for the table and in the file itself when the export is
+           finalized (see _ExecuteQuery() and FinalizeExport())."""
         if rowsToSkip is None:
             rowsToSkip = 0
         if rowLimit is None:
             rowLimit = sys.maxsize
-        self.__ExportTableHeader(tableName)
-        self.__ExportTableRows(rowsToSkip, rowLimit)
+        if self.columnar and self.lobChunkSize is not None:
+            raise LobStreamingNotSupported()
+        self._StartMetrics(tableName)
+        self.__ExportTableHeader(tableName, rangeClause, rangeArgs,
+                watermarkColumn, since)
+        if self.columnar:
+            numRows = self.__ExportTableBlocks(rowsToSkip, rowLimit)
+        else:
+            numRows = self.__ExportTableRows(rowsToSkip, rowLimit)
+        if self.index is not None:
+            self.index[-1]["numRows"] = numRows
+            self.index[-1]["endOffset"] = self.outFile.tell()
+        self._FinishMetrics(numRows)
 
     def FinalizeExport(self):
-        """Finalize the export."""
+        """Finalize the export. If the file is seekable an index is written
+           after the end of the data which records the name, offset, number
+           of rows and columns of each table (and the offset and number of
+           rows of each block) so that tables can be found without reading
+           the data that precedes them. If watermarks were recorded, they are
+           written as a dictionary (with the key "watermarks") after the last
+           table so that they are present even if the file is not seekable;
+           the index records the offset at which each table ends so that
+           readers of the index are not affected by its presence."""
+        if self.watermarks:
+            pickle.dump(dict(watermarks = self.watermarks), self.outFile,
+                    BINARY)
         pickle.dump(None, self.outFile, BINARY)
+        if self.index is not None:
+            offset = self.outFile.tell()
+            pickle.dump(self.index, self.outFile, BLOCK_PROTOCOL)
+            self.outFile.write(INDEX_TRAILER.pack(offset, INDEX_MAGIC))
+        self._WriteMetricsSummary()
+
+    def MetricsSummary(self, metrics = None):
+        """Return a summary of the metrics (those collected by this exporter
+           if not specified) as a dictionary containing the metrics for each
+           table and the totals across all of the tables."""
+        if metrics is None:
+            metrics = self.metrics
+        totals = dict(rows = 0, bytes = 0, fetchTime = 0.0,
+                serializeTime = 0.0, writeTime = 0.0, elapsedTime = 0.0)
+        for tableMetrics in metrics:
+            for key in totals:
+                totals[key] += tableMetrics[key]
+        totals["rowsPerSecond"] = totals["rows"] / \
+                max(totals["elapsedTime"], 1e-6)
+        return dict(tables = metrics, totals = totals)
+
+    def PrimaryKeyColumn(self, tableName):
+        """Return the name of the column making up the primary key of the
+           table or None if the table has no primary key or the primary key
+           is made up of more than one column."""
+        cursor = self.cursor.connection.cursor()
+        cursor.execute("""
+                select cc.column_name
+                from
+                  user_constraints c,
+                  user_cons_columns cc
+                where c.table_name = :tableName
+                  and c.constraint_type = 'P'
+                  and cc.constraint_name = c.constraint_name""",
+                tableName = tableName)
+        rows = cursor.fetchall()
+        if len(rows) == 1:
+            return rows[0][0]
+
+    def TableRanges(self, tableName, numRanges, keyColumn = None):
+        """Return a list of (clause, args) tuples that split the table into
+           at most the given number of ranges, suitable for passing to
+           ExportTable(). If no key column is specified the ranges are formed
+           from the rowids of the extents allocated to the table, which are
+           read from dba_extents; if that view is not accessible, the column
+           making up the primary key of the table is used as the key column
+           instead and if there is no such column an empty list is returned.
+           If a key column is specified or found, the ranges are formed from
+           the values of the key column and rows with a null key are included
+           in the first range."""
+        cursor = self.cursor.connection.cursor()
+        if keyColumn is None:
+            cursor.execute("""
+                    select count(*)
+                    from all_views
+                    where owner = 'SYS'
+                      and view_name = 'DBA_EXTENTS'""")
+            hasExtents, = cursor.fetchone()
+            if not hasExtents:
+                keyColumn = self.PrimaryKeyColumn(tableName)
+                if keyColumn is None:
+                    return []
+        if keyColumn is None:
+            cursor.execute("""
+                    select
+                      dbms_rowid.rowid_create(1, o.data_object_id,
+                          e.min_fno, e.min_block, 0),
+                      dbms_rowid.rowid_create(1, o.data_object_id,
+                          e.max_fno, e.max_block, 32767)
+                    from
+                      user_objects o,
+                      (select distinct
+                         grp,
+                         first_value(relative_fno) over (partition by grp
+                             order by relative_fno, block_id rows between
+                             unbounded preceding and unbounded following)
+                             min_fno,
+                         first_value(block_id) over (partition by grp
+                             order by relative_fno, block_id rows between
+                             unbounded preceding and unbounded following)
+                             min_block,
+                         last_value(relative_fno) over (partition by grp
+                             order by relative_fno, block_id rows between
+                             unbounded preceding and unbounded following)
+                             max_fno,
+                         last_value(block_id + blocks - 1) over
+                             (partition by grp order by relative_fno,
+                             block_id rows between unbounded preceding and
+                             unbounded following) max_block
+                       from
+                         (select
+                            relative_fno,
+                            block_id,
+                            blocks,
+                            trunc((sum(blocks) over (order by relative_fno,
+                                block_id) - 0.01) / (sum(blocks) over () /
+                                :numRanges)) grp
+                          from dba_extents
+                          where owner = user
+                            and segment_name = :tableName
+                            and segment_type = 'TABLE')) e
+                    where o.object_name = :tableName
+                      and o.object_type = 'TABLE'
+                    order by e.grp""",
+                    tableName = tableName,
+                    numRanges = numRanges)
+            return [("rowid between :minRowid and :maxRowid",
+                    dict(minRowid = minRowid, maxRowid = maxRowid)) \
+                    for minRowid, maxRowid in cursor.fetchall()]
+        cursor.execute("""
+                select min(%s)
+                from
+                  (select
+                     %s,
+                     ntile(:numRanges) over (order by %s) bucket
+                   from %s
+                   where %s is not null)
+                group by bucket
+                order by bucket""" % \
+                ((keyColumn,) * 3 + (tableName, keyColumn)),
+                numRanges = numRanges)
+        values = [v for v, in cursor.fetchall()]
+        ranges = []
+        for i, value in enumerate(values):
+            if i == 0 and len(values) == 1:
+                ranges.append((None, None))
+            elif i == 0:
+                ranges.append(("(%s < :maxValue or %s is null)" % \
+                        (keyColumn, keyColumn),
+                        dict(maxValue = values[i + 1])))
+            elif i == len(values) - 1:
+                ranges.append(("%s >= :minValue" % keyColumn,
+                        dict(minValue = value)))
+            else:
+                ranges.append(("%s >= :minValue and %s < :maxValue" % \
+                        (keyColumn, keyColumn),
+                        dict(minValue = value, maxValue = values[i + 1])))
+        return ranges
 
     def TablesInSchema(self):
         """Return a list of tables found in the schema."""
@@ -82,3 +858,224 @@ class Exporter:
                 where temporary = 'N'""")
         return [n for n, in self.cursor.fetchall()]
 
+
+class ParallelExporter:
+    """Export tables in parallel using a pool of worker processes, each with
+       its own connection to the database. Each table is written to its own
+       segment file and a manifest records the order of the segments so that
+       the Importer can process them as a single export. If consistent is
+       true, the current SCN is captured (unless one is specified) and every
+       worker queries its tables as of that SCN so that the segments form a
+       consistent snapshot; the SCN is recorded in the manifest. The metrics
+       collected by the workers for each segment are gathered in the metrics
+       attribute and a summary is written to metricsFileName, if set.
+
+       A codec registered with RegisterCodec() is registered in each worker
+       as well; its functions are pickled to be sent to the workers and so
+       must be defined at the top level of a module."""
+
+    def __init__(self, connectString, numWorkers, reportPoint = None,
+            columnar = True, codec = None, consistent = False,
+            asOfScn = None):
+        self.connectString = cx_OracleUtils.GetConnectString(connectString)
+        self.connection = cx_OracleUtils.Connect(self.connectString)
+        self.numWorkers = numWorkers
+        self.reportPoint = reportPoint
+        self.columnar = columnar
+        self.codec = codec
+        self.codecFunctions = None
+        if codec is not None:
+            self.codecFunctions = Codec(codec)
+        self.consistent = consistent or asOfScn is not None
+        self.asOfScn = asOfScn
+        self.metrics = []
+        self.metricsFileName = None
+
+    def ExportTables(self, manifestFileName, tableNames = None,
+            chunkSize = None, keyColumns = None):
+        """Export the tables (all of the tables in the schema if not
+           specified) to segment files and write the manifest. The largest
+           tables are handed to the workers first so that the time taken is
+           bounded by the time taken to export the largest table. If a chunk
+           size (in bytes) is specified, tables larger than that are split
+           into ranges, each of which is exported to its own segment; the
+           ranges are formed from rowids unless a key column is specified
+           for the table in the key columns dictionary (see
+           TableRanges())."""
+        if keyColumns is None:
+            keyColumns = {}
+        exporter = Exporter(None, self.connection.cursor(), None)
+        asOfScn = self.asOfScn
+        if self.consistent and asOfScn is None:
+            asOfScn = exporter.CurrentScn()
+        if tableNames is None:
+            tableNames = exporter.TablesInSchema()
+        sizes = self.TableSizes()
+        dirName = os.path.dirname(manifestFileName)
+        segments = []
+        tasks = []
+        for tableName in tableNames:
+            size = sizes.get(tableName, 0)
+            ranges = [(None, None)]
+            if chunkSize is not None and size > chunkSize:
+                numRanges = (size + chunkSize - 1) // chunkSize
+                ranges = exporter.TableRanges(tableName, numRanges,
+                        keyColumns.get(tableName)) or ranges
+            for chunkNum, (rangeClause, rangeArgs) in enumerate(ranges):
+                fileName = "%s.%d" % (os.path.basename(manifestFileName),
+                        len(segments) + 1)
+                segments.append((fileName, tableName, chunkNum + 1))
+                tasks.append((size / len(ranges), tableName,
+                        os.path.join(dirName, fileName), rangeClause,
+                        rangeArgs))
+        tasks.sort(key = lambda t: t[0], reverse = True)
+        context = multiprocessing.get_context("spawn")
+        pool = context.Pool(self.numWorkers, _InitializeWorker,
+                (self.connectString, self.codec, self.codecFunctions))
+        try:
+            results = [pool.apply_async(_ExportSegment,
+                    (t, f, self.reportPoint, self.columnar, self.codec, c,
+                    a, asOfScn)) \
+                    for s, t, f, c, a in tasks]
+            self.metrics = []
+            for result in results:
+                self.metrics.extend(result.get())
+        finally:
+            pool.terminate()
+            pool.join()
+        header = dict(format = FORMAT_NAME, version = FORMAT_VERSION,
+                segments = segments)
+        if asOfScn is not None:
+            header["asOfScn"] = asOfScn
+        with open(manifestFileName, "wb") as outFile:
+            pickle.dump(header, outFile, BINARY)
+        if self.metricsFileName is not None:
+            exporter.metricsFileName = self.metricsFileName
+            exporter.metrics = self.metrics
+            exporter._WriteMetricsSummary()
+
+    def TableSizes(self):
+        """Return a dictionary of the size in bytes of each table in the
+           schema."""
+        cursor = self.connection.cursor()
+        cursor.execute("""
+                select
+                  segment_name,
+                  sum(bytes)
+                from user_segments
+                where segment_type like 'TABLE%'
+                group by segment_name""")
+        return dict(cursor.fetchall())
+
+
+class ColumnBufferExporter(Exporter):
+    """Export data from a database as typed column buffers which can be
+       memory mapped and used without unpickling (see the ColumnBufferReader
+       class in cx_ImportData). Fixed width values (and the null indicators)
+       are stored in arrays with one element per row; strings and binary data
+       are stored as an array of offsets and the data itself. All arrays are
+       little endian and aligned on 8 byte boundaries. Numbers are exported as
+       strings unless native numbers are requested, in which case integers
+       with a precision of up to 18 digits are stored as 64-bit integers and
+       numbers with a precision of up to 15 digits and a non-zero scale as
+       64-bit floating point values; all other numbers (including
+       unconstrained numbers) are still fetched and stored as strings since
+       they cannot be stored in either without loss (see
+       _OutputTypeHandler())."""
+
+    def __init__(self, outFile, cursor, reportPoint, prefix = "",
+            nativeNumbers = False):
+        Exporter.__init__(self, outFile, cursor, reportPoint, prefix)
+        self.nativeNumbers = nativeNumbers
+        if nativeNumbers:
+            self.cursor.outputtypehandler = self._OutputTypeHandler
+        self.index = []
+        header = dict(format = FORMAT_NAME, version = FORMAT_VERSION,
+                layout = "buffers")
+        headerData = pickle.dumps(header, BINARY)
+        headerData += b"\0" * (-len(headerData) % BUFFER_ALIGNMENT)
+        self.outFile.write(headerData)
+        self.position = len(headerData)
+
+    def __BufferKind(self, descriptionRow, dataType):
+        """Return the kind of buffer used for the column."""
+        name, cxDataType, displaySize, internalSize, precision, scale, \
+                nullOk = descriptionRow
+        if cxDataType == cx_Oracle.NUMBER and self.nativeNumbers:
+            kind = self.__NumberKind(precision, scale)
+            if kind is not None:
+                return kind
+        dataType = dataType.split(",")[0]
+        if dataType in ("DATETIME", "TIMESTAMP"):
+            return BUFFER_DATETIME
+        elif dataType in BINARY_TYPES or dataType == "BLOB":
+            return BUFFER_BINARY
+        return BUFFER_STRING
+
+    def __NumberKind(self, precision, scale):
+        """Return the kind of buffer used for a number with the given
+           precision and scale or None if the number must be stored as a
+           string in order to avoid any loss."""
+        if scale == 0:
+            if precision is not None and 0 < precision < 19:
+                return BUFFER_INT64
+        elif precision is not None and 0 < precision < 16:
+            return BUFFER_FLOAT64
+
+    def _OutputTypeHandler(self, cursor, name, defaultType, size, precision,
+            scale):
+        """Return the variable used to fetch a number column when native
+           numbers are requested: an integer or floating point variable for
+           the numbers stored in fixed width buffers and a string variable
+           for all others so that their values are never converted to
+           floating point; numbers converted to strings by the database are
+           never more than 64 characters long."""
+        if defaultType != cx_Oracle.NUMBER:
+            return
+        kind = self.__NumberKind(precision, scale)
+        if kind == BUFFER_INT64:
+            return cursor.var(int, arraysize = cursor.arraysize)
+        elif kind == BUFFER_FLOAT64:
+            return cursor.var(float, arraysize = cursor.arraysize)
+        return cursor.var(str, 64, cursor.arraysize)
+
+    def ExportTable(self, tableName, rowsToSkip = None, rowLimit = None,
+            rangeClause = None, rangeArgs = None):
+        """Export the data in the table to the file as column buffers."""
+        if rowsToSkip is None:
+            rowsToSkip = 0
+        if rowLimit is None:
+            rowLimit = sys.maxsize
+        self._StartMetrics(tableName)
+        metrics = self.tableMetrics
+        columns = self._ExecuteQuery(tableName, rangeClause, rangeArgs)
+        entry = dict(name = tableName, offset = self.position, numRows = 0,
+                columns = [], blocks = [])
+        with tempfile.TemporaryFile() as spoolFile:
+            buffers = [ColumnBuffer(n, t, self.__BufferKind(r, t),
+                    spoolFile) \
+                    for (n, t), r in zip(columns, self.cursor.description)]
+            numRows = 0
+            for rows in self._FetchBatches(rowsToSkip, rowLimit):
+                startTime = time.perf_counter()
+                for columnBuffer, values in zip(buffers, zip(*rows)):
+                    columnBuffer.Append(values)
+                metrics["serializeTime"] += time.perf_counter() - startTime
+                numRows += len(rows)
+            entry["numRows"] = numRows
+            startTime = time.perf_counter()
+            for columnBuffer in buffers:
+                column, self.position = columnBuffer.Write(self.outFile,
+                        self.position)
+                entry["columns"].append(column)
+            metrics["writeTime"] += time.perf_counter() - startTime
+        metrics["bytes"] += self.position - entry["offset"]
+        self.index.append(entry)
+        self._FinishMetrics(numRows)
+
+    def FinalizeExport(self):
+        """Finalize the export by writing the index describing the location
+           of the buffers of each table."""
+        pickle.dump(self.index, self.outFile, BLOCK_PROTOCOL)
+        self.outFile.write(INDEX_TRAILER.pack(self.position, INDEX_MAGIC))
+        self._WriteMetricsSummary()
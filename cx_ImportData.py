@@ -1,66 +1,757 @@
 """Defines class for importing data from an export file."""
 
+import collections
+import concurrent.futures
+import inspect
+import json
+import mmap
 import pickle
+import cx_Exceptions
+import cx_ExportData
 import cx_Logging
 import cx_Oracle
+import cx_OracleUtils
 import os
 import sys
+import threading
+import time
+
+# define the size of the pickled None which terminates each table and the
+# export as a whole
+TERMINATOR_SIZE = len(pickle.dumps(None, cx_ExportData.BINARY))
+
+class ColumnNotFound(cx_Exceptions.BaseException):
+    message = "Column %(name)s not found in table %(tableName)s."
+
+
+class IndexNotFound(cx_Exceptions.BaseException):
+    message = "File %(fileName)s does not contain an index."
+
+
+class TableNotFound(cx_Exceptions.BaseException):
+    message = "Table %(name)s not found in the export."
+
+
+class UnsupportedLayout(cx_Exceptions.BaseException):
+    message = "File %(fileName)s contains column buffers which must be " \
+            "read with ColumnBufferReader."
+
+
+def ReadIndex(fileName):
+    """Return the index of the tables in the file (or in each of the segments
+       listed in the manifest) as a list of dictionaries containing the name,
+       file name, offset, chunk number, number of rows, columns and blocks of
+       each table. The offset at which the table ends (that of the next object
+       in the file) is included as well; it is recorded in the index by the
+       exporter but is calculated for files written before that was done."""
+    with open(fileName, "rb") as inFile:
+        header = pickle.load(inFile)
+    if isinstance(header, dict) and "segments" in header:
+        dirName = os.path.dirname(fileName)
+        segments = [(os.path.join(dirName, f), c) \
+                for f, t, c in header["segments"]]
+    else:
+        segments = [(fileName, 1)]
+    index = []
+    trailerSize = cx_ExportData.INDEX_TRAILER.size
+    for fileName, chunkNum in segments:
+        with open(fileName, "rb") as inFile:
+            inFile.seek(0, os.SEEK_END)
+            if inFile.tell() < trailerSize:
+                raise IndexNotFound(fileName = fileName)
+            inFile.seek(-trailerSize, os.SEEK_END)
+            offset, magic = cx_ExportData.INDEX_TRAILER.unpack(
+                    inFile.read(trailerSize))
+            if magic != cx_ExportData.INDEX_MAGIC:
+                raise IndexNotFound(fileName = fileName)
+            inFile.seek(offset)
+            entries = pickle.load(inFile)
+            endOffset = offset - TERMINATOR_SIZE
+            for entry in reversed(entries):
+                entry["fileName"] = fileName
+                entry["chunkNum"] = chunkNum
+                entry.setdefault("endOffset", endOffset)
+                endOffset = entry["offset"]
+            index.extend(entries)
+    return index
+
 
 class Importer:
-    """Handles importing data from the file."""
+    """Handles importing data from the file. The connection may be None if
+       the data is only to be read (see IterRows()). The watermarks recorded
+       by an incremental export are stored in the watermarks attribute once
+       all of the tables in the file have been read."""
 
     def __init__(self, connection):
         self.connection = connection
-        self.cursor = connection.cursor()
+        self.cursor = None
+        self.lobCursor = None
+        if connection is not None:
+            self.cursor = connection.cursor()
         self.inFile = None
+        self.mappedFile = None
+        self.mappedView = None
+        self.blockEnds = {}
+        self.useMmap = False
+        self.header = None
+        self.pendingObjects = []
+        self.segments = []
+        self.manifestSegments = []
+        self.fileName = None
+        self.index = None
+        self.columnStorage = []
+        self.decompressFunc = None
         self.reportPoint = None
         self.reportFunc = self.ReportProgress
         self.commitPoint = None
+        self.adaptiveBatchSize = False
+        self.maxBatchMemory = 16 * 1024 * 1024
+        self.minBatchSize = 10
+        self.maxBatchSize = 100000
+        self.latencyFraction = 0.05
+        self.batchSize = None
+        self.latency = None
+        self.directPath = False
+        self.disableConstraints = False
+        self.disableIndexes = False
+        self.noLogging = False
+        self.rejectFileName = None
+        self.rejectFile = None
+        self.checkpointFileName = None
+        self.currentFileName = None
+        self.tableFileName = None
+        self.tableOffset = None
+        self.objectOffset = None
+        self.positions = None
+        self.numTracked = 0
+        self.skipRows = 0
+        self.resumedRows = 0
+        self.tableName = None
+        self.columnNames = []
+        self.lobColumns = []
+        self.watermarks = {}
 
     def __iter__(self):
         return self
 
-    def DataInTable(self):
-        """Return a list of the data stored in the table."""
-        rows = []
-        while True:
-            row = pickle.load(self.inFile)
-            if row is None:
-                break
-            rows.append(row)
-        return rows
+    def __AdaptiveBatches(self, batches):
+        """Return the rows in the batches regrouped into batches of the size
+           currently chosen by the adaptive batch sizing logic."""
+        pendingRows = []
+        for rows in batches:
+            pendingRows.extend(rows)
+            while len(pendingRows) >= self.batchSize:
+                batchSize = self.batchSize
+                yield pendingRows[:batchSize]
+                pendingRows = pendingRows[batchSize:]
+        if pendingRows:
+            yield pendingRows
+
+    def __AdjustBatchSize(self, rows, elapsed):
+        """Adjust the batch size using the time taken to insert the rows. The
+           batch size is chosen so that the round trip latency is no more than
+           the given fraction of the time taken for each batch, within the
+           limit placed on the memory consumed by each batch; the batch size
+           is changed by no more than a factor of four at a time."""
+        sampleRows = rows[:10]
+        rowSize = sum(self.__EstimatedRowSize(r) for r in sampleRows) / \
+                len(sampleRows)
+        timePerRow = max(elapsed - self.latency, 1e-7) / len(rows)
+        batchSize = self.latency * (1 - self.latencyFraction) / \
+                (self.latencyFraction * timePerRow)
+        batchSize = min(batchSize, self.maxBatchMemory / rowSize,
+                self.batchSize * 4, self.maxBatchSize)
+        batchSize = max(batchSize, self.batchSize / 4, self.minBatchSize)
+        self.batchSize = int(batchSize)
+
+    def __Batches(self, blockOffsets = None):
+        """Return the rows stored in the table in batches suitable for passing
+           directly to executemany(); for files in the columnar format each
+           block forms a batch but for files in the original format batches
+           are formed up to the cursor's array size, ending at each commit
+           point. When positions are tracked, one is recorded for each batch;
+           rows to skip after resuming are skipped as they are read from files
+           in the original format since each row has its own position."""
+        if self.header is not None:
+            for block in self.__TableObjects(blockOffsets):
+                if self.decompressFunc is not None:
+                    block = pickle.loads(self.decompressFunc(block))
+                numRows, columns = block
+                columns = [cx_ExportData.DecodeColumn(s, d) \
+                        for s, d in zip(self.columnStorage, columns)]
+                rows = list(zip(*columns))
+                if self.positions is not None:
+                    self.__TrackPosition(self.currentFileName,
+                            self.objectOffset, len(rows))
+                if self.skipRows:
+                    rows = rows[self.skipRows:]
+                    self.skipRows = 0
+                yield rows
+        else:
+            numRows = 0
+            rows = []
+            for row in self.__TableObjects(lobFunc = self.__TemporaryLob):
+                if self.skipRows:
+                    self.skipRows -= 1
+                    continue
+                if not rows:
+                    fileName = self.currentFileName
+                    offset = self.objectOffset
+                rows.append(row)
+                numRows += 1
+                commit = (self.commitPoint is not None \
+                        and numRows % self.commitPoint == 0)
+                if commit or len(rows) == self.cursor.arraysize:
+                    if self.positions is not None:
+                        self.__TrackPosition(fileName, offset, len(rows))
+                    yield rows
+                    rows = []
+            if rows:
+                if self.positions is not None:
+                    self.__TrackPosition(fileName, offset, len(rows))
+                yield rows
+
+    def __Batched(self, rows, batchSize):
+        """Return the rows in lists of up to the given size."""
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batchSize:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def __CloseFile(self):
+        """Close the file (and the map of it, if it is memory mapped)."""
+        if self.mappedView is not None:
+            self.mappedView.release()
+            self.mappedView = None
+        if self.inFile is not None and self.inFile is not sys.stdin:
+            self.inFile.close()
+        self.inFile = None
+        if self.mappedFile is not None:
+            self.mappedFile.close()
+            self.mappedFile = None
+        self.blockEnds = {}
+
+    def __ColumnIndex(self, name):
+        """Return the index of the named column in the current table."""
+        try:
+            return self.columnNames.index(name)
+        except ValueError:
+            raise ColumnNotFound(name = name, tableName = self.tableName)
+
+    def __DiscardLob(self, lobType, chunks):
+        """Discard the chunks of a LOB value streamed after the row."""
+        for chunk in chunks:
+            pass
+
+    def __DisableForDirectPath(self, cursor, restoreStatements):
+        """Disable the features of the table requested for a direct path load
+           and add the statements required to restore them to the list."""
+        if self.disableIndexes:
+            cursor.execute("""
+                    select index_name
+                    from user_indexes
+                    where table_name = :tableName
+                      and uniqueness = 'NONUNIQUE'
+                      and status = 'VALID'""",
+                    tableName = self.tableName)
+            for indexName, in cursor.fetchall():
+                cursor.execute("alter index %s unusable" % indexName)
+                restoreStatements.append("alter index %s rebuild" % \
+                        indexName)
+        if self.disableConstraints:
+            cursor.execute("""
+                    select
+                      constraint_name,
+                      validated
+                    from user_constraints
+                    where table_name = :tableName
+                      and constraint_type in ('C', 'R')
+                      and status = 'ENABLED'""",
+                    tableName = self.tableName)
+            for constraintName, validated in cursor.fetchall():
+                cursor.execute("alter table %s disable constraint %s" % \
+                        (self.tableName, constraintName))
+                if validated == "VALIDATED":
+                    clause = "enable validate"
+                else:
+                    clause = "enable novalidate"
+                restoreStatements.append("alter table %s %s constraint %s" % \
+                        (self.tableName, clause, constraintName))
+        if self.noLogging:
+            cursor.execute("""
+                    select logging
+                    from user_tables
+                    where table_name = :tableName""",
+                    tableName = self.tableName)
+            row = cursor.fetchone()
+            if row is not None and row[0] == "YES":
+                cursor.execute("alter table %s nologging" % self.tableName)
+                restoreStatements.append("alter table %s logging" % \
+                        self.tableName)
+
+    def __EstimatedRowSize(self, row):
+        """Return the estimated size of the row in bytes."""
+        size = 0
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+            else:
+                size += 16
+        return size
+
+    def __FilteredRows(self, indexes, filters):
+        """Return the rows in the table, projected onto the columns with the
+           given indexes (all columns if None) and restricted to those rows
+           for which all of the filters (a list of column index and function
+           tuples) return true. In the columnar format only the columns that
+           are required are decoded and the filters are applied one column at
+           a time so that blocks without any matching rows are discarded
+           without decoding the remaining columns."""
+        if self.header is None:
+            for row in self.__TableObjects():
+                if filters and not all(f(row[i]) for i, f in filters):
+                    continue
+                if indexes is None:
+                    yield row
+                else:
+                    yield tuple(row[i] for i in indexes)
+            return
+        if indexes is None:
+            indexes = range(len(self.columnStorage))
+        for block in self.__TableObjects():
+            if self.decompressFunc is not None:
+                block = pickle.loads(self.decompressFunc(block))
+            numRows, columns = block
+            decoded = {}
+            matches = None
+            for i, func in filters:
+                if i not in decoded:
+                    decoded[i] = cx_ExportData.DecodeColumn(
+                            self.columnStorage[i], columns[i])
+                values = decoded[i]
+                if matches is None:
+                    matches = [r for r in range(numRows) if func(values[r])]
+                else:
+                    matches = [r for r in matches if func(values[r])]
+                if not matches:
+                    break
+            if matches is not None and not matches:
+                continue
+            for i in indexes:
+                if i not in decoded:
+                    decoded[i] = cx_ExportData.DecodeColumn(
+                            self.columnStorage[i], columns[i])
+            projected = [decoded[i] for i in indexes]
+            if matches is None:
+                yield from zip(*projected)
+            else:
+                for r in matches:
+                    yield tuple(c[r] for c in projected)
 
-    def ImportTable(self):
+    def __ImportTable(self, blockOffsets):
         """Import the data into the table and return the number of rows
            imported."""
-        numRows = 0
-        rowsToInsert = []
-        while True:
-            row = pickle.load(self.inFile)
-            if row is None:
-                break
-            rowsToInsert.append(row)
-            numRows += 1
-            commit = (self.commitPoint is not None \
-                    and numRows % self.commitPoint == 0)
-            if commit or len(rowsToInsert) == self.cursor.arraysize:
-                self.cursor.executemany(None, rowsToInsert)
-                rowsToInsert = []
-            if commit:
+        numRows = numCommitted = numReported = numRejected = 0
+        if self.checkpointFileName is not None:
+            if self.directPath or self.commitPoint is not None:
+                self.positions = collections.deque()
+            self.numTracked = 0
+            self.__WriteCheckpoint(0, False)
+        batches = self.__Batches(blockOffsets)
+        startTime = time.perf_counter()
+        if self.adaptiveBatchSize:
+            self.latency = self.__MeasureLatency()
+            self.batchSize = self.cursor.arraysize
+            batches = self.__AdaptiveBatches(batches)
+        for rows in batches:
+            batchStartTime = time.perf_counter()
+            if self.rejectFileName is None:
+                self.cursor.executemany(None, rows)
+            else:
+                self.cursor.executemany(None, rows, batcherrors = True)
+                numRejected += self.__RejectRows(rows)
+            if self.adaptiveBatchSize:
+                self.__AdjustBatchSize(rows,
+                        time.perf_counter() - batchStartTime)
+            numRows += len(rows)
+            if self.directPath or self.commitPoint is not None \
+                    and numRows // self.commitPoint \
+                    > numCommitted // self.commitPoint:
                 self.connection.commit()
-            if self.reportPoint and numRows % self.reportPoint == 0:
-                self.reportFunc(numRows)
-        if rowsToInsert:
-            self.cursor.executemany(None, rowsToInsert)
+                numCommitted = numRows
+                if self.checkpointFileName is not None:
+                    self.__WriteCheckpoint(numCommitted, False)
+            if self.reportPoint and numRows // self.reportPoint \
+                    > numReported // self.reportPoint:
+                self.__ReportProgress(numRows, startTime)
+                numReported = numRows
         self.connection.commit()
-        if not self.reportPoint or numRows == 0 \
-                or numRows % self.reportPoint != 0:
-            self.reportFunc(numRows)
+        if self.checkpointFileName is not None:
+            self.__WriteCheckpoint(numRows, True)
+            self.positions = None
+        if numRows == 0 or numRows != numReported:
+            self.__ReportProgress(numRows, startTime)
+        if numRejected:
+            cx_Logging.Trace("  %d rows rejected (written to %s).",
+                    numRejected, self.rejectFileName)
+        return numRows - numRejected
+
+    def __JoinLob(self, lobType, chunks):
+        """Return the value of a LOB streamed after the row."""
+        if lobType == cx_Oracle.BLOB:
+            return b"".join(chunks)
+        return "".join(chunks)
+
+    def __LoadBlock(self):
+        """Load the next object (normally a block) stored for the table from
+           the file. Blocks in a memory mapped file are unpickled from a view
+           of the map."""
+        if self.blockEnds:
+            offset = self.inFile.tell()
+            end = self.blockEnds.get(offset)
+            if end is not None:
+                with self.mappedView[offset:end] as data:
+                    obj = pickle.loads(data)
+                self.inFile.seek(end)
+                return obj
+        return pickle.load(self.inFile)
+
+    def __LobChunks(self):
+        """Return the chunks of a LOB value streamed after the row."""
+        while True:
+            chunk = pickle.load(self.inFile)
+            if chunk is None:
+                break
+            yield chunk
+
+    def __MapFile(self):
+        """Memory map the file and, if it has an index, determine where each
+           block ends so that blocks can be unpickled from a view of the map
+           without first being copied out of it. The last block of each table
+           is followed by the pickled None that terminates the table; the end
+           of the table is recorded in the index (or, for files written
+           before that was done, the last table is followed by the pickled
+           None that terminates the export)."""
+        self.mappedFile = self.inFile
+        self.inFile = mmap.mmap(self.mappedFile.fileno(), 0,
+                access = mmap.ACCESS_READ)
+        self.inFile.seek(self.mappedFile.tell())
+        self.mappedView = memoryview(self.inFile)
+        trailerSize = cx_ExportData.INDEX_TRAILER.size
+        if len(self.inFile) < trailerSize:
+            return
+        indexOffset, magic = cx_ExportData.INDEX_TRAILER.unpack_from(
+                self.inFile, len(self.inFile) - trailerSize)
+        if magic != cx_ExportData.INDEX_MAGIC:
+            return
+        with self.mappedView[indexOffset:] as data:
+            index = pickle.loads(data)
+        tableEnd = indexOffset - TERMINATOR_SIZE
+        for entry in reversed(index):
+            tableEnd = entry.get("endOffset", tableEnd)
+            blockEnd = tableEnd - TERMINATOR_SIZE
+            for blockOffset, numRows in reversed(entry["blocks"]):
+                self.blockEnds[blockOffset] = blockEnd
+                blockEnd = blockOffset
+            tableEnd = entry["offset"]
+
+    def __MeasureLatency(self):
+        """Return the round trip latency to the database in seconds."""
+        latency = None
+        for i in range(3):
+            startTime = time.perf_counter()
+            self.connection.ping()
+            elapsed = time.perf_counter() - startTime
+            if latency is None or elapsed < latency:
+                latency = elapsed
+        return latency
+
+    def __OpenFile(self, fileName):
+        """Open the file (or segment) and read its header, if present. If
+           requested, files in the columnar format are memory mapped and the
+           blocks in them unpickled directly from the map (see __MapFile());
+           files in the original format consist of many small objects which
+           are read faster through a buffered file."""
+        self.__CloseFile()
+        if fileName == "-":
+            self.inFile = sys.stdin
+            self.inFileSize = None
+        else:
+            self.inFile = open(fileName, "rb")
+            self.inFileSize = os.stat(fileName).st_size * 1.0
+        self.currentFileName = fileName
+        self.header = None
+        self.decompressFunc = None
+        self.pendingObjects = []
+        obj = pickle.load(self.inFile)
+        if isinstance(obj, dict) \
+                and obj.get("format") == cx_ExportData.FORMAT_NAME:
+            self.header = obj
+            if obj.get("layout") == "buffers":
+                raise UnsupportedLayout(fileName = fileName)
+            codec = obj.get("codec")
+            if codec is not None:
+                compressFunc, self.decompressFunc = \
+                        cx_ExportData.Codec(codec)
+            if self.useMmap and fileName != "-" and "segments" not in obj:
+                self.__MapFile()
+        else:
+            self.pendingObjects.append(obj)
+
+    def __OpenSegment(self):
+        """Open the next segment listed in the manifest."""
+        fileName, tableName, chunkNum = self.segments.pop(0)
+        self.__OpenFile(fileName)
+
+    def __PositionAt(self, fileName, offset):
+        """Position the file (or segment listed in the manifest) at the given
+           offset."""
+        if self.manifestSegments:
+            fileNames = [f for f, t, c in self.manifestSegments]
+            segmentIndex = fileNames.index(fileName)
+            self.segments = self.manifestSegments[segmentIndex + 1:]
+        if fileName != self.currentFileName:
+            self.__OpenFile(fileName)
+        self.pendingObjects = []
+        self.inFile.seek(offset)
+
+    def __ReadObject(self):
+        """Read the next object from the file."""
+        if self.pendingObjects:
+            return self.pendingObjects.pop()
+        return pickle.load(self.inFile)
+
+    def __RejectRows(self, rows):
+        """Write the rows that failed in the last batch to the reject file,
+           one per line with the table name and error, and return the number
+           of rows rejected."""
+        errors = self.cursor.getbatcherrors()
+        if errors and self.rejectFile is None:
+            self.rejectFile = open(self.rejectFileName, "w")
+        for error in errors:
+            message = error.message.strip().replace("\n", " ")
+            self.rejectFile.write("%s\t%s\t%r\n" % \
+                    (self.tableName, message, rows[error.offset]))
+        if errors:
+            self.rejectFile.flush()
+        return len(errors)
+
+    def __ReportProgress(self, numRows, startTime):
+        """Call the report function, including the rate and batch size if
+           adaptive batch sizing is enabled and the report function accepts
+           them; report functions accepting only the number of rows are
+           passed only that."""
+        args = {}
+        if self.adaptiveBatchSize:
+            elapsed = max(time.perf_counter() - startTime, 1e-6)
+            args = dict(rowsPerSecond = numRows / elapsed,
+                    batchSize = self.batchSize)
+            try:
+                inspect.signature(self.reportFunc).bind(numRows, **args)
+            except (TypeError, ValueError):
+                args = {}
+        self.reportFunc(numRows, **args)
+
+    def __RestoreAfterDirectPath(self, cursor, restoreStatements):
+        """Execute each of the statements restoring what was disabled for a
+           direct path load, logging those that fail, and return the error
+           raised by the first statement that failed, if any."""
+        firstError = None
+        for statement in restoreStatements:
+            try:
+                cursor.execute(statement)
+            except Exception as error:
+                cx_Logging.Error("Unable to execute %s: %s", statement, error)
+                if firstError is None:
+                    firstError = error
+        return firstError
+
+    def __TableObjects(self, blockOffsets = None, lobFunc = None):
+        """Return the objects (rows or blocks) stored for the current table,
+           continuing on to the segments containing the remaining chunks of
+           the table, if any, so that they are reassembled in order. If block
+           offsets are specified, only those blocks are returned. LOB values
+           streamed after a row are replaced by the value returned by the LOB
+           function (which is passed the LOB type and the chunks); if no
+           function is specified the chunks are joined."""
+        if lobFunc is None:
+            lobFunc = self.__JoinLob
+        if blockOffsets is not None:
+            for offset in blockOffsets:
+                self.inFile.seek(offset)
+                self.objectOffset = offset
+                yield self.__LoadBlock()
+            return
+        while True:
+            if self.positions is not None:
+                self.objectOffset = self.inFile.tell()
+            obj = self.__LoadBlock()
+            if obj is not None:
+                if self.lobColumns and self.header is None:
+                    obj = self.__StreamedLobs(obj, lobFunc)
+                yield obj
+            elif self.segments and self.segments[0][2] > 1:
+                self.__OpenSegment()
+                self.__ReadObject()
+                pickle.load(self.inFile)
+            else:
+                break
+
+    def __StreamedLobs(self, row, lobFunc):
+        """Return the row with the lengths written in place of streamed LOB
+           values replaced by the values returned by the LOB function."""
+        for i, lobType in self.lobColumns:
+            if isinstance(row[i], int):
+                row = row[:i] + (lobFunc(lobType, self.__LobChunks()),) + \
+                        row[i + 1:]
+        return row
+
+    def __TemporaryLob(self, lobType, chunks):
+        """Return a temporary LOB into which the chunks of a LOB value
+           streamed after the row are written one at a time so that the
+           value is never held in memory in its entirety."""
+        if self.lobCursor is None:
+            self.lobCursor = self.connection.cursor()
+        lobVar = self.lobCursor.var(lobType)
+        self.lobCursor.execute("""
+                begin
+                  dbms_lob.createtemporary(:lob, true);
+                end;""",
+                lob = lobVar)
+        lob = lobVar.getvalue()
+        offset = 1
+        for chunk in chunks:
+            lob.write(chunk, offset)
+            offset += len(chunk)
+        return lob
+
+    def __TrackPosition(self, fileName, offset, numRows):
+        """Track the position of the batch of rows just read (the position of
+           the block or of the first row in the batch) so that the position of
+           the first row not yet committed can be written to the checkpoint
+           file."""
+        if self.positions:
+            prevFileName, prevOffset, firstRow, prevRows, skipRows = \
+                    self.positions[-1]
+            firstRow += prevRows
+        else:
+            firstRow = self.numTracked
+        self.positions.append((fileName, offset, firstRow,
+                numRows - self.skipRows, self.skipRows))
+
+    def __WriteCheckpoint(self, numCommitted, complete):
+        """Write the checkpoint file recording the position of the first row
+           in the table that has not been committed. The file is written to a
+           temporary file first and then renamed so that a failure while
+           writing does not destroy the previous checkpoint."""
+        while self.positions:
+            fileName, offset, firstRow, numRows, skipRows = self.positions[0]
+            if firstRow + numRows > numCommitted:
+                break
+            self.positions.popleft()
+            self.numTracked = firstRow + numRows
+        if self.positions and not complete:
+            fileName, offset, firstRow, numRows, skipRows = self.positions[0]
+            skipRows += numCommitted - firstRow
+        else:
+            fileName = self.currentFileName
+            offset = self.inFile.tell()
+            skipRows = 0 if complete else self.skipRows
+        checkpoint = dict(fileName = self.fileName,
+                tableName = self.tableName,
+                tableFileName = self.tableFileName,
+                tableOffset = self.tableOffset,
+                positionFileName = fileName,
+                positionOffset = offset,
+                skipRows = skipRows,
+                numRows = self.resumedRows + numCommitted,
+                complete = complete)
+        tempFileName = self.checkpointFileName + ".tmp"
+        with open(tempFileName, "w") as outFile:
+            json.dump(checkpoint, outFile)
+        os.replace(tempFileName, self.checkpointFileName)
+
+    def Close(self):
+        """Close the file being imported and the reject file, if any rows
+           were rejected."""
+        self.__CloseFile()
+        if self.rejectFile is not None:
+            self.rejectFile.close()
+            self.rejectFile = None
+
+    def DataInTable(self):
+        """Return a list of the data stored in the table."""
+        return list(self.IterRows())
+
+    def ImportTable(self, blockOffsets = None):
+        """Import the data into the table (only the given blocks, if
+           specified) and return the number of rows imported."""
+        if not self.directPath:
+            return self.__ImportTable(blockOffsets)
+        cursor = self.connection.cursor()
+        restoreStatements = []
+        try:
+            self.__DisableForDirectPath(cursor, restoreStatements)
+            numRows = self.__ImportTable(blockOffsets)
+        except:
+            self.connection.rollback()
+            self.__RestoreAfterDirectPath(cursor, restoreStatements)
+            raise
+        error = self.__RestoreAfterDirectPath(cursor, restoreStatements)
+        if error is not None:
+            raise error
         return numRows
 
+    def Index(self):
+        """Return the index of the tables in the file (see ReadIndex())."""
+        if self.index is None:
+            if self.fileName == "-":
+                raise IndexNotFound(fileName = "<stdin>")
+            self.index = ReadIndex(self.fileName)
+        return self.index
+
+    def IterRows(self, columnNames = None, filters = None,
+            batchSize = None):
+        """Return an iterator over the rows stored in the table which reads
+           the rows from the file as they are needed so that the table is
+           never held in memory. If column names are specified only those
+           columns are returned, in the order given. If filters (a dictionary
+           of column names and functions which accept a value and return a
+           boolean) are specified only the rows for which all of the functions
+           return true are returned; the filters are applied while decoding
+           (see __FilteredRows()). If a batch size is specified, lists of up
+           to that many rows are returned instead of individual rows."""
+        indexes = None
+        if columnNames is not None:
+            indexes = [self.__ColumnIndex(n) for n in columnNames]
+        filterItems = []
+        if filters is not None:
+            filterItems = [(self.__ColumnIndex(n), f) \
+                    for n, f in filters.items()]
+        rows = self.__FilteredRows(indexes, filterItems)
+        if batchSize is None:
+            return rows
+        return self.__Batched(rows, batchSize)
+
     def __next__(self):
         """Return the next table name to process."""
-        tableName = pickle.load(self.inFile)
+        while True:
+            if self.fileName != "-":
+                self.tableFileName = self.currentFileName
+                self.tableOffset = 0
+                if not self.pendingObjects:
+                    self.tableOffset = self.inFile.tell()
+            tableName = self.__ReadObject()
+            if isinstance(tableName, dict):
+                self.watermarks.update(tableName["watermarks"])
+                continue
+            if tableName is not None or not self.segments:
+                break
+            self.__OpenSegment()
         if tableName is None:
             raise StopIteration
         columnNames = []
@@ -74,34 +765,302 @@ class Importer:
                 dataSize = int(dataSize)
             dataType = getattr(cx_Oracle, dataType)
             columnNames.append(name)
-            bindVars.append(self.cursor.var(dataType, dataSize))
-            bindVarNames.append(":%s" % len(bindVars))
-        sql = "insert into %s (%s) values (%s)" % \
-                (tableName, ",".join(columnNames), ",".join(bindVarNames))
-        self.cursor.prepare(sql)
-        self.cursor.setinputsizes(*bindVars)
+            if self.cursor is not None:
+                bindVars.append(self.cursor.var(dataType, dataSize))
+            bindVarNames.append(":%s" % len(columnNames))
+        self.columnStorage = [cx_ExportData.ColumnStorage(t) \
+                for n, t in columns]
+        self.lobColumns = [(i, getattr(cx_Oracle, t)) \
+                for i, (n, t) in enumerate(columns) \
+                if t in cx_ExportData.STREAMED_TYPES]
+        if self.directPath:
+            hint = "/*+ APPEND_VALUES */ "
+        else:
+            hint = ""
+        sql = "insert %sinto %s (%s) values (%s)" % (hint, tableName,
+                ",".join(columnNames), ",".join(bindVarNames))
+        self.tableName = tableName
+        self.columnNames = columnNames
+        self.skipRows = self.resumedRows = 0
+        if self.cursor is not None:
+            self.cursor.prepare(sql)
+            self.cursor.setinputsizes(*bindVars)
         return tableName, columnNames
 
     def OpenFile(self, fileName):
-        """Open the file for importing."""
-        if fileName == "-":
-            self.inFile = sys.stdin
-            self.inFileSize = None
-        else:
-            self.inFile = open(fileName, "rb")
-            self.inFileSize = os.stat(fileName).st_size * 1.0
+        """Open the file for importing. Files in the columnar format start
+           with a header identifying the format and the codec used to compress
+           the blocks, if any; files in the original format start directly
+           with the name of the first table. If the file is a manifest written
+           by a parallel export the segments it lists are processed in order
+           as if they formed a single file."""
+        self.fileName = fileName
+        self.segments = self.manifestSegments = []
+        self.index = None
+        self.watermarks = {}
+        self.__OpenFile(fileName)
+        if self.header is not None and "segments" in self.header:
+            dirName = os.path.dirname(fileName)
+            self.manifestSegments = [(os.path.join(dirName, f), t, c) \
+                    for f, t, c in self.header["segments"]]
+            self.segments = list(self.manifestSegments)
+            if self.segments:
+                self.__OpenSegment()
+            else:
+                self.pendingObjects.append(None)
 
-    def ReportProgress(self, numRows):
-        """Report progress on the import."""
+    def ReportProgress(self, numRows, rowsPerSecond = None,
+            batchSize = None):
+        """Report progress on the import; the position in the file is the
+           offset into the map if the file is memory mapped."""
         if self.inFileSize is not None:
             percent = (self.inFile.tell() / self.inFileSize) * 100
             cx_Logging.Trace("  %d rows imported (%.0f%% of file).",
                     numRows, percent)
         else:
             cx_Logging.Trace("  %d rows imported.", numRows)
+        if rowsPerSecond is not None:
+            cx_Logging.Trace("  %.0f rows/sec with batch size %d.",
+                    rowsPerSecond, batchSize)
+
+    def ResumeFromCheckpoint(self):
+        """Open the file recorded in the checkpoint file and position it at
+           the first row that was not committed by the import that wrote the
+           checkpoint. The table name and column names of the table to import
+           are returned as is done when iterating; if the table recorded in
+           the checkpoint was completed, the next table is returned
+           instead."""
+        with open(self.checkpointFileName) as inFile:
+            checkpoint = json.load(inFile)
+        self.OpenFile(checkpoint["fileName"])
+        if checkpoint["complete"]:
+            self.__PositionAt(checkpoint["positionFileName"],
+                    checkpoint["positionOffset"])
+            return next(self)
+        self.__PositionAt(checkpoint["tableFileName"],
+                checkpoint["tableOffset"])
+        result = next(self)
+        self.__PositionAt(checkpoint["positionFileName"],
+                checkpoint["positionOffset"])
+        self.skipRows = checkpoint["skipRows"]
+        self.resumedRows = checkpoint["numRows"]
+        cx_Logging.Trace("  resuming after %d rows committed.",
+                self.resumedRows)
+        return result
+
+    def SeekTable(self, name):
+        """Position the file at the start of the named table using the index
+           and return the table name and column names as is done when
+           iterating."""
+        for entry in self.Index():
+            if entry["name"] == name and entry["chunkNum"] == 1:
+                break
+        else:
+            raise TableNotFound(name = name)
+        self.__PositionAt(entry["fileName"], entry["offset"])
+        return next(self)
 
     def SkipTable(self):
-        """Skip the import of the table."""
-        while pickle.load(self.inFile):
-            pass
+        """Skip the import of the table. If the file has an index, the file
+           is positioned directly after the table (and the segments containing
+           the remaining chunks of the table, if any, are skipped) so that no
+           data needs to be read; otherwise, the rows (or blocks) of the table
+           are read and discarded."""
+        try:
+            index = self.Index()
+        except IndexNotFound:
+            index = []
+        for i, entry in enumerate(index):
+            if entry["fileName"] == self.tableFileName \
+                    and entry["offset"] == self.tableOffset:
+                break
+        else:
+            for obj in self.__TableObjects(lobFunc = self.__DiscardLob):
+                pass
+            return
+        self.pendingObjects = []
+        self.inFile.seek(entry["endOffset"])
+        isLast = i == len(index) - 1 \
+                or index[i + 1]["fileName"] != entry["fileName"]
+        if isLast:
+            while self.segments and self.segments[0][2] > 1:
+                self.segments.pop(0)
+
+    def Tables(self):
+        """Return a list of (name, numRows) tuples for the tables in the file
+           using the index so that no data needs to be read. The chunks of a
+           table exported in ranges are reported as a single table."""
+        tables = []
+        for entry in self.Index():
+            if entry["chunkNum"] > 1:
+                name, numRows = tables[-1]
+                tables[-1] = (name, numRows + entry["numRows"])
+            else:
+                tables.append((entry["name"], entry["numRows"]))
+        return tables
+
+
+class ColumnBufferReader:
+    """Reads the files written by cx_ExportData.ColumnBufferExporter. The
+       file is memory mapped and the buffers of each column are returned as
+       memoryviews of the mapped file so that no data is copied."""
+
+    def __init__(self, fileName):
+        self.index = ReadIndex(fileName)
+        self.inFile = open(fileName, "rb")
+        self.mmap = mmap.mmap(self.inFile.fileno(), 0,
+                access = mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+    def __Buffer(self, location, typeCode):
+        """Return a memoryview of the buffer at the given location."""
+        offset, length = location
+        return self.view[offset:offset + length].cast(typeCode)
+
+    def Close(self):
+        """Close the file; all memoryviews returned must be released first."""
+        self.view.release()
+        self.mmap.close()
+        self.inFile.close()
+
+    def Columns(self, tableName):
+        """Return a list of (name, kind, buffers) tuples for the columns of
+           the table where buffers is a dictionary of memoryviews. The nulls
+           buffer contains a byte for each row (1 if the value is null); fixed
+           width columns have a values buffer with an element for each row and
+           variable width columns have an offsets buffer with one more element
+           than there are rows and a data buffer."""
+        for entry in self.index:
+            if entry["name"] == tableName:
+                break
+        else:
+            raise TableNotFound(name = tableName)
+        columns = []
+        for column in entry["columns"]:
+            locations = column["buffers"]
+            buffers = dict(nulls = self.__Buffer(locations["nulls"], "B"))
+            typeCode = cx_ExportData.BUFFER_TYPE_CODES.get(column["kind"])
+            if typeCode is not None:
+                buffers["values"] = self.__Buffer(locations["values"],
+                        typeCode)
+            else:
+                buffers["offsets"] = self.__Buffer(locations["offsets"], "q")
+                buffers["data"] = self.__Buffer(locations["data"], "B")
+            columns.append((column["name"], column["kind"], buffers))
+        return columns
+
+    def Tables(self):
+        """Return a list of (name, numRows) tuples for the tables in the
+           file."""
+        return [(e["name"], e["numRows"]) for e in self.index]
+
+
+class ParallelImporter:
+    """Import the tables in a file (or the segments listed in a manifest) in
+       parallel using a pool of worker threads, each with its own connection
+       to the database. The index written at the end of the file is used to
+       hand out tables (or, if chunkRows is set, chunks of blocks of tables
+       in the columnar format) independently to the workers; each worker
+       commits at its own commit points and progress is aggregated and
+       reported through reportFunc."""
+
+    def __init__(self, connectString, numWorkers, commitPoint = None,
+            reportPoint = None, chunkRows = None):
+        self.connectString = cx_OracleUtils.GetConnectString(connectString)
+        self.numWorkers = numWorkers
+        self.commitPoint = commitPoint
+        self.reportPoint = reportPoint
+        self.chunkRows = chunkRows
+        self.useMmap = False
+        self.reportFunc = self.ReportProgress
+        self.totalRows = 0
+        self.numRows = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.importers = []
+
+    def __ImportUnit(self, fileName, offset, blockOffsets):
+        """Import a unit of work (run in a worker thread)."""
+        importer = getattr(self.local, "importer", None)
+        if importer is None:
+            connection = cx_OracleUtils.Connect(self.connectString)
+            importer = self.local.importer = Importer(connection)
+            importer.commitPoint = self.commitPoint
+            importer.reportPoint = self.reportPoint
+            importer.useMmap = self.useMmap
+            with self.lock:
+                self.importers.append(importer)
+        if importer.fileName != fileName:
+            importer.OpenFile(fileName)
+        importer.inFile.seek(offset)
+        importer.pendingObjects = []
+        tableName, columnNames = next(importer)
+        progress = [0]
+        def ReportUnitProgress(numRows, **args):
+            with self.lock:
+                self.numRows += numRows - progress[0]
+                progress[0] = numRows
+                self.reportFunc(self.numRows)
+        importer.reportFunc = ReportUnitProgress
+        return tableName, importer.ImportTable(blockOffsets)
 
+    def __Units(self, index, tableNames):
+        """Return the units of work (estimated number of rows, file name,
+           offset and block offsets) found in the index."""
+        units = []
+        for entry in index:
+            if tableNames is not None and entry["name"] not in tableNames:
+                continue
+            blocks = entry["blocks"]
+            if self.chunkRows is None or not blocks:
+                units.append((entry["numRows"], entry["fileName"],
+                        entry["offset"], None))
+                continue
+            chunk = []
+            chunkRows = 0
+            for blockOffset, numRows in blocks:
+                chunk.append(blockOffset)
+                chunkRows += numRows
+                if chunkRows >= self.chunkRows:
+                    units.append((chunkRows, entry["fileName"],
+                            entry["offset"], chunk))
+                    chunk = []
+                    chunkRows = 0
+            if chunk:
+                units.append((chunkRows, entry["fileName"], entry["offset"],
+                        chunk))
+        units.sort(key = lambda u: u[0], reverse = True)
+        return units
+
+    def ImportFile(self, fileName, tableNames = None):
+        """Import the tables (all of them if not specified) found in the file
+           and return a dictionary of the number of rows imported into each
+           table."""
+        units = self.__Units(ReadIndex(fileName), tableNames)
+        self.totalRows = sum(u[0] for u in units)
+        self.numRows = 0
+        results = {}
+        executor = concurrent.futures.ThreadPoolExecutor(self.numWorkers)
+        try:
+            futures = [executor.submit(self.__ImportUnit, f, o, b) \
+                    for n, f, o, b in units]
+            for future in concurrent.futures.as_completed(futures):
+                tableName, numRows = future.result()
+                results[tableName] = results.get(tableName, 0) + numRows
+        finally:
+            executor.shutdown(cancel_futures = True)
+            for importer in self.importers:
+                importer.Close()
+                importer.connection.close()
+            self.importers = []
+            self.local = threading.local()
+        return results
+
+    def ReportProgress(self, numRows):
+        """Report progress on the import across all of the workers."""
+        if self.totalRows:
+            percent = (numRows / self.totalRows) * 100
+            cx_Logging.Trace("  %d rows imported (%.0f%% of rows).",
+                    numRows, percent)
+        else:
+            cx_Logging.Trace("  %d rows imported.", numRows)
@@ -1,9 +1,25 @@
 """Define extensions to the cx_Oracle module."""
 
+import asyncio
+import collections
+import concurrent.futures
 import cx_Exceptions
 import cx_Logging
 import cx_Oracle
+import functools
 import sys
+import threading
+import time
+
+# define the number of threads in the pool shared by asynchronous connections
+# which are not given a thread pool of their own
+ASYNC_WORKERS = 10
+_asyncExecutor = None
+_asyncExecutorLock = threading.Lock()
+
+# define the value indicating that the timeout of the pool applies when a
+# connection is acquired; None means wait forever
+_POOL_TIMEOUT = object()
 
 class Connection(cx_Oracle.Connection):
     BFILE = cx_Oracle.BFILE
@@ -22,19 +38,139 @@ class Connection(cx_Oracle.Connection):
     Date = cx_Oracle.Date
     Timestamp = cx_Oracle.Timestamp
     trimMessage = logSql = True
+    logRows = 5
+    maxDetailRows = 10
+
+    # each cursor in the statement cache holds a cursor open on the server
+    # which counts against OPEN_CURSORS (50 by default) so the size of the
+    # cache matches the default of cx_Oracle's own statement cache and must
+    # be kept well below the value of OPEN_CURSORS for the database
+    statementCacheSize = 20
+
+    def __init__(self, *args, **kwargs):
+        cx_Oracle.Connection.__init__(self, *args, **kwargs)
+        self.statementCache = collections.OrderedDict()
+        self.statementCacheHits = self.statementCacheMisses = 0
+
+    def __CacheCursor(self, key, statement):
+        """Return a new cursor prepared with the statement and place it in the
+           statement cache, closing the least recently used cursor if the
+           cache is full."""
+        self.statementCacheMisses += 1
+        cursor = self.cursor()
+        cursor.prepare(statement)
+        self.statementCache[key] = cursor
+        if len(self.statementCache) > self.statementCacheSize:
+            key, oldCursor = self.statementCache.popitem(last = False)
+            oldCursor.close()
+        return cursor
+
+    def __CachedCursor(self, key):
+        """Return the cursor cached for the statement identified by the key
+           or None if no such cursor is cached."""
+        cursor = self.statementCache.get(key)
+        if cursor is not None:
+            self.statementCacheHits += 1
+            self.statementCache.move_to_end(key)
+        return cursor
+
+    def __DeleteCursor(self, tableName, names):
+        """Return the cursor used for deleting rows from the table."""
+        key = ("delete", tableName, names)
+        cursor = self.__CachedCursor(key)
+        if cursor is None:
+            whereClauses = ["%s = :%s" % (n, n) for n in names]
+            statement = "delete from %s where %s" % \
+                    (tableName, " and ".join(whereClauses))
+            cursor = self.__CacheCursor(key, statement)
+        return cursor
+
+    def __ExecuteBatch(self, cursor, rows, arrayDmlRowCounts):
+        """Execute the cursor for the batch of rows and return the row count
+           (or the list of row counts if array DML row counts are
+           requested)."""
+        cursor.executemany(None, rows, arraydmlrowcounts = arrayDmlRowCounts)
+        if arrayDmlRowCounts:
+            return cursor.getarraydmlrowcounts()
+        return cursor.rowcount
+
+    def __ExecuteRows(self, rows, columnNames, batchSize, arrayDmlRowCounts,
+            cursorFunc):
+        """Execute the statements for the rows (dictionaries or, if column
+           names are specified, sequences) in batches. Consecutive rows
+           containing the same column names form a batch which is executed
+           with the cursor returned by the function for those names when it
+           reaches the batch size or when a row with different names follows
+           it, so that the rows are executed in the order given. The row
+           count (or the list of row counts if array DML row counts are
+           requested) of each batch is returned in that order."""
+        results = []
+        batch = []
+        batchNames = None
+        for row in rows:
+            if columnNames is not None:
+                row = dict(zip(columnNames, row))
+            names = tuple(sorted(row))
+            if batch and (names != batchNames or len(batch) >= batchSize):
+                results.append(self.__ExecuteBatch(cursorFunc(batchNames),
+                        batch, arrayDmlRowCounts))
+                batch = []
+            batchNames = names
+            batch.append(row)
+        if batch:
+            results.append(self.__ExecuteBatch(cursorFunc(batchNames), batch,
+                    arrayDmlRowCounts))
+        return results
+
+    def __InsertCursor(self, tableName, names):
+        """Return the cursor used for inserting rows into the table."""
+        key = ("insert", tableName, names)
+        cursor = self.__CachedCursor(key)
+        if cursor is None:
+            bindNames = [":%s" % n for n in names]
+            statement = "insert into %s (%s) values (%s)" % \
+                    (tableName, ",".join(names), ",".join(bindNames))
+            cursor = self.__CacheCursor(key, statement)
+        return cursor
+
+    def __UpdateCursor(self, tableName, setNames, whereNames):
+        """Return the cursor used for updating rows in the table."""
+        key = ("update", tableName, setNames, whereNames)
+        cursor = self.__CachedCursor(key)
+        if cursor is None:
+            setClauses = ["%s = :%s" % (n, n) for n in setNames]
+            whereClauses = ["%s = :%s" % (n, n) for n in whereNames]
+            statement = "update %s set %s where %s" % (tableName,
+                    ",".join(setClauses), " and ".join(whereClauses))
+            cursor = self.__CacheCursor(key, statement)
+        return cursor
 
     def cursor(self):
         cursor = Cursor(self)
         cursor.arraysize = 50
         return cursor
 
+    def ClearStatementCache(self):
+        """Close the cursors in the statement cache used by DeleteRow(),
+           InsertRow() and UpdateRow()."""
+        for cursor in self.statementCache.values():
+            cursor.close()
+        self.statementCache.clear()
+
     def DeleteRow(self, tableName, **args):
         """Delete a row from a table."""
-        whereClauses = ["%s = :%s" % (n, n) for n in args]
-        statement = "delete from %s where %s" % \
-                (tableName, " and ".join(whereClauses))
-        cursor = self.cursor()
-        cursor.execute(statement, **args)
+        cursor = self.__DeleteCursor(tableName, tuple(sorted(args)))
+        cursor.execute(None, args)
+
+    def DeleteRows(self, tableName, rows, columnNames = None,
+            batchSize = 1000, arrayDmlRowCounts = False):
+        """Delete rows from a table, identified by the values in each row
+           (dictionaries or, if column names are specified, sequences), in
+           batches of up to the given size. The row count of each batch is
+           returned (see __ExecuteRows())."""
+        return self.__ExecuteRows(rows, columnNames, batchSize,
+                arrayDmlRowCounts,
+                lambda names: self.__DeleteCursor(tableName, names))
 
     def ExceptionHandler(self, excType, excValue, excTraceback):
         if excType is None or excValue is None \
@@ -56,12 +192,17 @@ class Connection(cx_Oracle.Connection):
 
     def InsertRow(self, tableName, **args):
         """Insert a row into the table."""
-        names = list(args.keys())
-        bindNames = [":%s" % n for n in names]
-        statement = "insert into %s (%s) values (%s)" % \
-                (tableName, ",".join(names), ",".join(bindNames))
-        cursor = self.cursor()
-        cursor.execute(statement, **args)
+        cursor = self.__InsertCursor(tableName, tuple(sorted(args)))
+        cursor.execute(None, args)
+
+    def InsertRows(self, tableName, rows, columnNames = None,
+            batchSize = 1000, arrayDmlRowCounts = False):
+        """Insert rows (dictionaries or, if column names are specified,
+           sequences) into the table in batches of up to the given size. The
+           row count of each batch is returned (see __ExecuteRows())."""
+        return self.__ExecuteRows(rows, columnNames, batchSize,
+                arrayDmlRowCounts,
+                lambda names: self.__InsertCursor(tableName, names))
 
     def IsValidOracleName(self, name):
         """Return true if the name is valid for use within Oracle."""
@@ -74,17 +215,44 @@ class Connection(cx_Oracle.Connection):
 
     def UpdateRow(self, tableName, *whereNames, **args):
         """Update a row in the table."""
-        setClauses = ["%s = :%s" % (n, n) for n in args \
-                if n not in whereNames]
-        whereClauses = ["%s = :%s" % (n, n) for n in whereNames]
-        statement = "update %s set %s where %s" % \
-                (tableName, ",".join(setClauses), " and ".join(whereClauses))
-        cursor = self.cursor()
-        cursor.execute(statement, **args)
+        setNames = tuple(sorted(n for n in args if n not in whereNames))
+        cursor = self.__UpdateCursor(tableName, setNames,
+                tuple(sorted(whereNames)))
+        cursor.execute(None, args)
+
+    def UpdateRows(self, tableName, rows, whereNames, columnNames = None,
+            batchSize = 1000, arrayDmlRowCounts = False):
+        """Update rows in the table in batches of up to the given size. Each
+           row (a dictionary or, if column names are specified, a sequence)
+           contains the values of the columns named in whereNames, which
+           identify the row to update, and the new values of the other
+           columns. The row count of each batch is returned (see
+           __ExecuteRows())."""
+        whereNames = tuple(sorted(whereNames))
+        def UpdateCursor(names):
+            setNames = tuple(n for n in names if n not in whereNames)
+            return self.__UpdateCursor(tableName, setNames, whereNames)
+        return self.__ExecuteRows(rows, columnNames, batchSize,
+                arrayDmlRowCounts, UpdateCursor)
 
 
 class Cursor(cx_Oracle.Cursor):
 
+    def __FormatRows(self, rows, numRows):
+        """Return the rows formatted for output. If there are more than twice
+           the specified number of rows, only that many rows at the start and
+           at the end are formatted and the rest are counted."""
+        if isinstance(rows, int):
+            return []
+        if len(rows) > numRows * 2:
+            numOmitted = len(rows) - numRows * 2
+            output = ["    %s" % (r,) for r in rows[:numRows]]
+            output.append("    ... %d rows omitted ..." % numOmitted)
+            if numRows > 0:
+                output.extend("    %s" % (r,) for r in rows[-numRows:])
+            return output
+        return ["    %s" % (r,) for r in rows]
+
     def blob(self, _value):
         """Return a BLOB variable containing the given value."""
         var = self.var(self.connection.BLOB)
@@ -116,7 +284,7 @@ class Cursor(cx_Oracle.Cursor):
             return cx_Oracle.Cursor.execute(self, _sql, _args)
         except:
             exc = self.connection.ExceptionHandler(*sys.exc_info())
-            exc.details.append("SQL: %s" % _sql or self.statement)
+            exc.details.append("SQL: %s" % (_sql or self.statement))
             exc.details.append("Bind Variables:")
             if isinstance(_args, dict):
                 _output = [(k, v) for k, v in _args.items() \
@@ -156,23 +324,32 @@ class Cursor(cx_Oracle.Cursor):
             raise cx_Exceptions.TooManyRows(numRows = len(rows))
         return rows[0]
 
-    def executemany(self, _sql, _args):
+    def executemany(self, _sql, _args, **_kwargs):
+        """Wrap the executemany so that unhandled exceptions are handled; any
+           keyword arguments (such as batcherrors) are passed through. Only
+           the first and last few rows (as specified by the connection's
+           logRows and maxDetailRows attributes) are logged or added to the
+           details of the exception so that large batches are not formatted
+           in their entirety."""
         try:
             if self.connection.logSql \
                     and cx_Logging.Debug("SQL\n%s", _sql or self.statement):
-                 _output = ["    %s" % (r,) for r in _args]
-                 cx_Logging.Debug("ROWS (%s):\n%s", len(_output),
-                         "\n".join(_output))
-            return cx_Oracle.Cursor.executemany(self, _sql, _args)
+                 _output = self.__FormatRows(_args, self.connection.logRows)
+                 if _output:
+                     cx_Logging.Debug("ROWS (%s):\n%s", len(_args),
+                             "\n".join(_output))
+            return cx_Oracle.Cursor.executemany(self, _sql, _args, **_kwargs)
         except:
             exc = self.connection.ExceptionHandler(*sys.exc_info())
-            exc.details.append("SQL: %s" % _sql or self.statement)
+            exc.details.append("SQL: %s" % (_sql or self.statement))
+            if isinstance(_args, int):
+                raise exc
             if self.rowcount > -1 and self.rowcount < len(_args):
                 exc.details.append("FAILED ROW: %s" % (_args[self.rowcount],))
             exc.details.append("ROWS (%s, %s before error):" % \
                     (len(_args), self.rowcount))
-            for row in _args:
-                exc.details.append("    %s" % (row,))
+            exc.details.extend(self.__FormatRows(_args,
+                    self.connection.maxDetailRows))
             raise exc
 
     def nclob(self, _value):
@@ -181,6 +358,15 @@ class Cursor(cx_Oracle.Cursor):
         var.setvalue(0, _value)
         return var
 
+    def parse(self, _sql):
+        """Wrap the parse so that unhandled exceptions are handled."""
+        try:
+            return cx_Oracle.Cursor.parse(self, _sql)
+        except:
+            exc = self.connection.ExceptionHandler(*sys.exc_info())
+            exc.details.append("SQL: %s" % _sql)
+            raise exc
+
 
 class DatabaseException(cx_Exceptions.BaseException):
     dbErrorCode = None
@@ -202,3 +388,317 @@ class DatabaseException(cx_Exceptions.BaseException):
             if pos > 0:
                 self.message = self.message[11:pos].rstrip()
 
+
+def _AsyncExecutor():
+    """Return the thread pool shared by asynchronous connections, creating it
+       the first time it is needed."""
+    global _asyncExecutor
+    with _asyncExecutorLock:
+        if _asyncExecutor is None:
+            _asyncExecutor = concurrent.futures.ThreadPoolExecutor(
+                    ASYNC_WORKERS, thread_name_prefix = "cx_OracleEx")
+    return _asyncExecutor
+
+
+class PoolTimeout(cx_Exceptions.BaseException):
+    message = "Timed out waiting for a connection for user %(user)s."
+
+
+class ConnectionPool:
+    """Thread safe pool of connections kept in a sub-pool for each user,
+       password and dsn."""
+
+    def __init__(self, minSessions = 1, maxSessions = 10, timeout = None,
+            healthCheckInterval = 60, connectionClass = Connection,
+            **connectArgs):
+        self.minSessions = minSessions
+        self.maxSessions = maxSessions
+        self.timeout = timeout
+        self.healthCheckInterval = healthCheckInterval
+        self.connectionClass = connectionClass
+        self.connectArgs = connectArgs
+        self.resetSessions = True
+        self.resetFunc = None
+        self.condition = threading.Condition()
+        self.idleConnections = {}
+        self.numConnections = {}
+        self.poolKeys = {}
+
+    def __Connect(self, key):
+        """Return a new connection for the sub-pool, releasing the slot that
+           was reserved for it if the connection cannot be established."""
+        user, password, dsn = key
+        try:
+            connection = self.connectionClass(user, password, dsn,
+                    **self.connectArgs)
+        except:
+            with self.condition:
+                self.numConnections[key] -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.poolKeys[id(connection)] = key
+        return connection
+
+    def __Discard(self, connection, keepSlot = False):
+        """Close the connection and remove it from its sub-pool. If the slot
+           is kept, it is reserved for a connection that replaces it."""
+        with self.condition:
+            key = self.poolKeys.pop(id(connection))
+            if not keepSlot:
+                self.numConnections[key] -= 1
+                self.condition.notify()
+        try:
+            connection.close()
+        except cx_Oracle.DatabaseError:
+            pass
+
+    def __IsHealthy(self, connection):
+        """Return true if the connection responds to a ping."""
+        try:
+            connection.ping()
+            return True
+        except cx_Oracle.DatabaseError:
+            return False
+
+    def __ResetSession(self, connection):
+        """Reset the state of the session so that it can be handed out to
+           another user of the pool."""
+        if self.resetSessions:
+            cursor = connection.cursor()
+            cursor.execute("""
+                    begin
+                      dbms_session.reset_package;
+                      execute immediate
+                          'alter session set current_schema = "' ||
+                          user || '"';
+                    end;""")
+            cursor.close()
+        if self.resetFunc is not None:
+            self.resetFunc(connection)
+
+    def Acquire(self, user, password, dsn, timeout = _POOL_TIMEOUT):
+        """Return a connection from the sub-pool for the user, password and
+           dsn; the connection must be returned with Release(). If no timeout
+           is specified the timeout of the pool applies; a timeout of None
+           waits forever."""
+        key = (user, password, dsn)
+        if timeout is _POOL_TIMEOUT:
+            timeout = self.timeout
+        if timeout is not None:
+            endTime = time.monotonic() + timeout
+        numToOpen = 0
+        with self.condition:
+            if key not in self.numConnections:
+                self.idleConnections[key] = []
+                self.numConnections[key] = 0
+            minSessions = max(self.minSessions, 1)
+            if self.numConnections[key] < minSessions:
+                numToOpen = minSessions - self.numConnections[key]
+                self.numConnections[key] = minSessions
+            idleConnections = self.idleConnections[key]
+            while numToOpen == 0:
+                if idleConnections:
+                    connection, lastUsed = idleConnections.pop()
+                    break
+                if self.numConnections[key] < self.maxSessions:
+                    self.numConnections[key] += 1
+                    connection = None
+                    break
+                remaining = None
+                if timeout is not None:
+                    remaining = endTime - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(user = user)
+                self.condition.wait(remaining)
+        for i in range(numToOpen - 1):
+            try:
+                connection = self.__Connect(key)
+            except:
+                with self.condition:
+                    self.numConnections[key] -= numToOpen - i - 1
+                    self.condition.notify_all()
+                raise
+            with self.condition:
+                idleConnections.append((connection, time.monotonic()))
+                self.condition.notify()
+        if numToOpen or connection is None:
+            return self.__Connect(key)
+        if time.monotonic() - lastUsed >= self.healthCheckInterval \
+                and not self.__IsHealthy(connection):
+            cx_Logging.Debug("Replacing unhealthy pooled connection for %s.",
+                    user)
+            self.__Discard(connection, keepSlot = True)
+            return self.__Connect(key)
+        return connection
+
+    def Close(self):
+        """Close all of the idle connections in the pool."""
+        with self.condition:
+            connections = [c for idleConnections in \
+                    self.idleConnections.values() \
+                    for c, lastUsed in idleConnections]
+            for idleConnections in self.idleConnections.values():
+                idleConnections.clear()
+        for connection in connections:
+            self.__Discard(connection)
+
+    def Release(self, connection):
+        """Return the connection to the pool; any uncommitted changes are
+           rolled back and the session is reset."""
+        try:
+            connection.rollback()
+            self.__ResetSession(connection)
+        except (cx_Oracle.DatabaseError, DatabaseException):
+            self.__Discard(connection)
+            return
+        except:
+            self.__Discard(connection)
+            raise
+        with self.condition:
+            key = self.poolKeys[id(connection)]
+            self.idleConnections[key].append((connection, time.monotonic()))
+            self.condition.notify()
+
+
+class AsyncConnection:
+    """Asynchronous facade for a connection (by default of the Connection
+       class defined in this module). The blocking calls are run on a thread
+       pool of bounded size (shared by all asynchronous connections unless a
+       thread pool is specified) so that the number of threads does not grow
+       with the number of sessions driven by the event loop; calls on one
+       connection (and its cursors) are run one at a time. Database errors
+       are raised as DatabaseException, as is done by the connection's
+       exception handler."""
+
+    def __init__(self, connection, executor = None):
+        self.connection = connection
+        self.executor = executor or _AsyncExecutor()
+        self.lock = asyncio.Lock()
+
+    def __Call(self, method, args, kwargs):
+        """Call the method, translating database errors (run in a worker
+           thread)."""
+        try:
+            return method(*args, **kwargs)
+        except cx_Oracle.DatabaseError:
+            raise self.connection.ExceptionHandler(*sys.exc_info())
+
+    async def close(self):
+        await self.Run(self.connection.close)
+
+    async def commit(self):
+        await self.Run(self.connection.commit)
+
+    def cursor(self):
+        return AsyncCursor(self, self.connection.cursor())
+
+    async def rollback(self):
+        await self.Run(self.connection.rollback)
+
+    @classmethod
+    async def Connect(cls, user, password, dsn, executor = None,
+            connectionClass = Connection, **connectArgs):
+        """Return an asynchronous connection to the database; the connection
+           is established on the thread pool."""
+        if executor is None:
+            executor = _AsyncExecutor()
+        loop = asyncio.get_running_loop()
+        connection = await loop.run_in_executor(executor,
+                functools.partial(connectionClass, user, password, dsn,
+                        **connectArgs))
+        return cls(connection, executor)
+
+    async def Run(self, method, *args, **kwargs):
+        """Run the blocking method on the thread pool once all prior calls on
+           the connection have completed and return its result. If the
+           caller is cancelled the method still runs to completion on the
+           thread pool and the connection remains locked until it has."""
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor,
+                    functools.partial(self.__Call, method, args, kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                while not future.done():
+                    try:
+                        await asyncio.wait([future])
+                    except asyncio.CancelledError:
+                        pass
+                raise
+
+
+class AsyncCursor:
+    """Asynchronous facade for a cursor of an asynchronous connection (see
+       AsyncConnection). Iterating asynchronously over the cursor returns the
+       rows fetched arraysize rows at a time."""
+
+    def __init__(self, asyncConnection, cursor):
+        self.connection = asyncConnection
+        self.cursor = cursor
+
+    def __aiter__(self):
+        return self.__Rows()
+
+    async def __Rows(self):
+        while True:
+            rows = await self.fetchmany()
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+    @property
+    def arraysize(self):
+        return self.cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, value):
+        self.cursor.arraysize = value
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    async def close(self):
+        await self.connection.Run(self.cursor.close)
+
+    async def execute(self, _sql, _args = None, **_kwargs):
+        if _args is None:
+            _args = _kwargs
+        return await self.connection.Run(self.cursor.execute, _sql, _args)
+
+    async def executeandfetchall(self, _sql, _args = None, **_kwargs):
+        """Execute the statement and return all of the rows from the cursor."""
+        if _args is None:
+            _args = _kwargs
+        return await self.connection.Run(self.cursor.executeandfetchall,
+                _sql, _args)
+
+    async def executeandfetchone(self, _sql, _args = None, **_kwargs):
+        """Execute the statement and return one and only one row (see
+           Cursor.executeandfetchone())."""
+        if _args is None:
+            _args = _kwargs
+        return await self.connection.Run(self.cursor.executeandfetchone,
+                _sql, _args)
+
+    async def executemany(self, _sql, _args, **_kwargs):
+        return await self.connection.Run(self.cursor.executemany, _sql,
+                _args, **_kwargs)
+
+    async def fetchall(self):
+        return await self.connection.Run(self.cursor.fetchall)
+
+    async def fetchmany(self, numRows = None):
+        if numRows is None:
+            numRows = self.cursor.arraysize
+        return await self.connection.Run(self.cursor.fetchmany, numRows)
+
+    async def fetchone(self):
+        return await self.connection.Run(self.cursor.fetchone)
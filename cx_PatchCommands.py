@@ -11,9 +11,10 @@ import sys
 
 class Processor(object):
 
-    def __init__(self, connection, onErrorContinue = False):
+    def __init__(self, connection, onErrorContinue = False, pool = None):
         self.connection = connection
         self.onErrorContinue = onErrorContinue
+        self.pool = pool
 
     def _LogCommand(self, command):
         separator = "-" * 66
@@ -72,12 +73,22 @@ class ExecuteSQLCommands(CommandBase):
         parser = cx_OracleParser.SimpleParser()
         sql = open(self.fileName).read()
         connectStatementClass = parser.parser.processor.ConnectStatement
+        pooledConnection = None
         try:
             for statement in parser.IterParse(sql, user):
                 if isinstance(statement, connectStatementClass):
-                    connection = cx_OracleEx.Connection(statement.user,
-                            statement.password or connection.password,
-                            statement.dsn or connection.dsn)
+                    password = statement.password or connection.password
+                    dsn = statement.dsn or connection.dsn
+                    if processor.pool is None:
+                        connection = cx_OracleEx.Connection(statement.user,
+                                password, dsn)
+                    else:
+                        if pooledConnection is not None:
+                            processor.pool.Release(pooledConnection)
+                            pooledConnection = None
+                        connection = pooledConnection = \
+                                processor.pool.Acquire(statement.user,
+                                        password, dsn)
                     cursor = connection.cursor()
                     cx_Logging.Trace("%s", statement.GetLogMessage(cursor))
                     parser.parser.processor.owner = statement.user
@@ -98,4 +109,7 @@ class ExecuteSQLCommands(CommandBase):
             cx_Logging.Error("Parsing failed at line %s (%s...)",
                     value.arguments["lineNumber"],
                     value.arguments["remainingString"][:100])
+        finally:
+            if pooledConnection is not None:
+                processor.pool.Release(pooledConnection)
 
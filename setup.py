@@ -8,6 +8,7 @@ To install:
 from distutils.core import setup
 
 modules = [
+        "cx_DiffData",
         "cx_ExportData",
         "cx_ImportData",
         "cx_OracleDebugger",
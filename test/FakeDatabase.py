@@ -0,0 +1,112 @@
+"""Defines stand ins for the database objects used by the tests so that no
+   database is required."""
+
+import io
+
+
+class ExportCursor:
+    """Stand in for the cursor used by the Exporter; tables is a dictionary of
+       table names and (description, rows) tuples."""
+
+    def __init__(self, tables, arraysize = 4):
+        self.tables = tables
+        self.arraysize = arraysize
+
+    def __iter__(self):
+        while self.rows:
+            yield self.rows.pop(0)
+
+    def execute(self, sql, args = None):
+        self.description, rows = self.tables[sql.split()[3]]
+        self.rows = list(rows)
+
+    def fetchmany(self, numRows = None):
+        rows = self.rows[:self.arraysize]
+        self.rows = self.rows[self.arraysize:]
+        return rows
+
+    def parse(self, sql):
+        self.description, rows = self.tables[sql.split()[3]]
+
+
+class ImportConnection:
+    """Stand in for the connection used by the Importer; the rows inserted
+       are kept in pendingRows until they are committed to committedRows."""
+
+    def __init__(self):
+        self.committedRows = []
+        self.pendingRows = []
+        self.statements = []
+
+    def commit(self):
+        self.committedRows.extend(self.pendingRows)
+        self.pendingRows = []
+
+    def cursor(self):
+        return ImportCursor(self)
+
+    def ping(self):
+        pass
+
+    def rollback(self):
+        self.pendingRows = []
+
+
+class ImportCursor:
+    """Stand in for the cursor used by the Importer."""
+    arraysize = 3
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, args = None, **kwargs):
+        self.connection.statements.append(sql)
+
+    def executemany(self, sql, rows, **kwargs):
+        self.connection.pendingRows.extend(rows)
+
+    def prepare(self, sql):
+        self.connection.statements.append(sql)
+
+    def setinputsizes(self, *args):
+        pass
+
+    def var(self, dataType, size = 0):
+        return Variable()
+
+
+class Lob:
+    """Stand in for a LOB read from or written to the database."""
+
+    def __init__(self, value = None):
+        self.value = value
+
+    def read(self, offset, amount):
+        return self.value[offset - 1:offset - 1 + amount]
+
+    def size(self):
+        return len(self.value)
+
+    def write(self, data, offset):
+        if self.value is None:
+            self.value = data
+        else:
+            self.value = self.value[:offset - 1] + data
+
+
+class UnseekableFile(io.BytesIO):
+    """Stand in for a pipe to which an export is written."""
+
+    def seekable(self):
+        return False
+
+
+class Variable:
+    """Stand in for a variable; its value is a LOB as is the case for the
+       variables used to create temporary LOBs."""
+
+    def __init__(self):
+        self.value = Lob()
+
+    def getvalue(self):
+        return self.value
@@ -0,0 +1,121 @@
+"""Check that the calls made on an asynchronous connection (and its cursors)
+   are run one at a time on the thread pool, that database errors are
+   translated by the connection's exception handler and that a cancelled
+   call keeps the connection locked until it has completed. Stand in
+   connections and cursors are used so that no database is required."""
+
+import asyncio
+import concurrent.futures
+import cx_Oracle
+import cx_OracleEx
+import threading
+import time
+
+ROWS = [(i, "r%d" % i) for i in range(7)]
+
+
+class TranslatedError(Exception):
+    pass
+
+
+class Connection:
+    """Stand in for a connection which records the calls made on it and the
+       largest number of calls that were running at the same time."""
+
+    def __init__(self, user, password, dsn):
+        self.calls = []
+        self.numRunning = self.maxRunning = 0
+        self.lock = threading.Lock()
+
+    def Call(self, name, duration = 0.01):
+        with self.lock:
+            self.numRunning += 1
+            self.maxRunning = max(self.maxRunning, self.numRunning)
+        time.sleep(duration)
+        with self.lock:
+            self.numRunning -= 1
+            self.calls.append(name)
+
+    def commit(self):
+        self.Call("commit")
+
+    def cursor(self):
+        return Cursor(self)
+
+    def ExceptionHandler(self, excType, excValue, excTraceback):
+        return TranslatedError(str(excValue))
+
+
+class Cursor:
+    arraysize = 3
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, args):
+        self.connection.Call(sql)
+        if sql == "fail":
+            raise cx_Oracle.DatabaseError("ORA-00942: table does not exist")
+        self.rows = list(ROWS)
+
+    def fetchmany(self, numRows):
+        self.connection.Call("fetch %d" % numRows)
+        rows = self.rows[:numRows]
+        self.rows = self.rows[numRows:]
+        return rows
+
+
+async def Main(executor):
+    connection = await cx_OracleEx.AsyncConnection.Connect("user", "pw",
+            "dsn", executor, connectionClass = Connection)
+    rawConnection = connection.connection
+
+    # calls are run one at a time even though the pool has several threads
+    cursors = [connection.cursor() for i in range(4)]
+    await asyncio.gather(*[c.execute("select %d" % i) \
+            for i, c in enumerate(cursors)], connection.commit())
+    assert rawConnection.maxRunning == 1
+    assert sorted(rawConnection.calls) == \
+            ["commit"] + ["select %d" % i for i in range(4)]
+
+    # rows are fetched arraysize rows at a time while iterating
+    rawConnection.calls = []
+    cursor = connection.cursor()
+    await cursor.execute("select rows")
+    rows = [r async for r in cursor]
+    assert rows == ROWS
+    assert rawConnection.calls == ["select rows"] + ["fetch 3"] * 4
+
+    # database errors are translated by the exception handler
+    try:
+        await cursor.execute("fail")
+    except TranslatedError as e:
+        assert "ORA-00942" in str(e)
+    else:
+        raise AssertionError("error not raised")
+
+    # a cancelled call completes before the next call on the connection runs
+    rawConnection.calls = []
+    started = threading.Event()
+    proceed = threading.Event()
+    def Blocking():
+        started.set()
+        proceed.wait(10)
+        rawConnection.Call("blocking", 0)
+    blockingTask = asyncio.ensure_future(connection.Run(Blocking))
+    while not started.is_set():
+        await asyncio.sleep(0.001)
+    blockingTask.cancel()
+    commitTask = asyncio.ensure_future(connection.commit())
+    await asyncio.sleep(0.05)
+    assert not blockingTask.done() and not commitTask.done()
+    assert rawConnection.calls == []
+    proceed.set()
+    await commitTask
+    assert blockingTask.cancelled()
+    assert rawConnection.calls == ["blocking", "commit"]
+
+
+with concurrent.futures.ThreadPoolExecutor(4) as executor:
+    asyncio.run(Main(executor))
+print("All asynchronous calls were serialized on the connection.")
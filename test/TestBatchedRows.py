@@ -0,0 +1,98 @@
+"""Check that InsertRows(), UpdateRows() and DeleteRows() execute the rows in
+   the order given, in batches of consecutive rows with the same columns, and
+   that the cursors prepared for them are kept in the statement cache. A
+   stand in for the cursors of the connection is used so that no database is
+   required."""
+
+import collections
+import cx_OracleEx
+
+
+class Cursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+        self.statement = None
+
+    def close(self):
+        self.closed = True
+
+    def executemany(self, sql, rows, arraydmlrowcounts = False):
+        self.connection.batches.append((self.statement, rows))
+        self.rowcount = len(rows)
+
+    def getarraydmlrowcounts(self):
+        return [1] * self.rowcount
+
+    def prepare(self, statement):
+        self.statement = statement
+
+
+class Connection(cx_OracleEx.Connection):
+
+    def __init__(self):
+        self.statementCache = collections.OrderedDict()
+        self.statementCacheHits = self.statementCacheMisses = 0
+        self.batches = []
+        self.cursors = []
+
+    def cursor(self):
+        cursor = Cursor(self)
+        self.cursors.append(cursor)
+        return cursor
+
+
+INSERT_AB = "insert into t (A,B) values (:A,:B)"
+INSERT_A = "insert into t (A) values (:A)"
+
+# rows are batched in order, a new batch starting when the columns change
+connection = Connection()
+rows = [dict(A = 1, B = 2), dict(B = 4, A = 3), dict(A = 5),
+        dict(A = 6, B = 7), dict(A = 8, B = 9), dict(A = 10, B = 11)]
+assert connection.InsertRows("t", rows, batchSize = 2) == [2, 1, 2, 1]
+assert connection.batches == [(INSERT_AB, rows[:2]), (INSERT_A, rows[2:3]),
+        (INSERT_AB, rows[3:5]), (INSERT_AB, rows[5:])]
+assert len(connection.cursors) == 2
+assert connection.statementCacheMisses == 2
+assert connection.statementCacheHits == 2
+
+# sequences of values are named by the column names given
+connection.batches = []
+assert connection.InsertRows("t", [(1, 2), (3, 4)], columnNames = ["A", "B"],
+        arrayDmlRowCounts = True) == [[1, 1]]
+assert connection.batches == [(INSERT_AB,
+        [dict(A = 1, B = 2), dict(A = 3, B = 4)])]
+assert connection.statementCacheHits == 3
+
+# the columns named in whereNames identify the rows to update
+connection.batches = []
+rows = [dict(ID = 1, A = 2, B = 3), dict(ID = 2, A = 4), dict(ID = 3, A = 5)]
+assert connection.UpdateRows("t", rows, ["ID"]) == [1, 2]
+assert connection.batches == [
+        ("update t set A = :A,B = :B where ID = :ID", rows[:1]),
+        ("update t set A = :A where ID = :ID", rows[1:])]
+
+# rows are deleted using the values of all of their columns
+connection.batches = []
+assert connection.DeleteRows("t", [(1, "x"), (2, "y")],
+        columnNames = ["ID", "CODE"]) == [2]
+assert connection.batches == [
+        ("delete from t where CODE = :CODE and ID = :ID",
+         [dict(ID = 1, CODE = "x"), dict(ID = 2, CODE = "y")])]
+assert connection.DeleteRows("t", []) == []
+
+# the least recently used cursor is closed when the cache is full
+connection = Connection()
+connection.statementCacheSize = 2
+connection.InsertRows("a", [dict(A = 1)])
+connection.InsertRows("b", [dict(A = 1)])
+connection.InsertRows("a", [dict(A = 1)])
+connection.InsertRows("c", [dict(A = 1)])
+assert [c.closed for c in connection.cursors] == [False, True, False]
+assert list(connection.statementCache) == [("insert", "a", ("A",)),
+        ("insert", "c", ("A",))]
+connection.ClearStatementCache()
+assert all(c.closed for c in connection.cursors)
+assert not connection.statementCache
+print("All rows were executed in order in batches using cached cursors.")
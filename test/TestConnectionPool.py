@@ -0,0 +1,143 @@
+"""Check that the connection pool enforces its limits, waits for connections
+   up to the timeout given, keeps at least the minimum number of sessions
+   open and releases the slots of connections that fail to be established or
+   reset. Stand in connections are used so that no database is required."""
+
+import cx_Oracle
+import cx_OracleEx
+import threading
+import time
+
+KEY = ("user", "pw", "dsn")
+
+
+class Connection:
+    """Stand in for a connection; connection attempts whose numbers are in
+       failAt fail, as do resets of the session when resetFails is set and
+       pings when unhealthy is set."""
+    failAt = set()
+    numConnects = 0
+
+    def __init__(self, user, password, dsn):
+        Connection.numConnects += 1
+        if Connection.numConnects in Connection.failAt:
+            raise cx_Oracle.DatabaseError("ORA-12541: TNS:no listener")
+        self.closed = False
+        self.resetFails = False
+        self.unhealthy = False
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self):
+        return Cursor(self)
+
+    def ping(self):
+        if self.unhealthy:
+            raise cx_Oracle.DatabaseError("ORA-03113: end-of-file")
+
+    def rollback(self):
+        pass
+
+
+class Cursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def close(self):
+        pass
+
+    def execute(self, sql):
+        if self.connection.resetFails:
+            raise cx_Oracle.DatabaseError("ORA-04068: package state lost")
+
+
+def Pool(minSessions, maxSessions, timeout = 0.05, failAt = ()):
+    """Return a new pool, with connections numbered from 1 again."""
+    Connection.numConnects = 0
+    Connection.failAt = set(failAt)
+    return cx_OracleEx.ConnectionPool(minSessions, maxSessions, timeout,
+            connectionClass = Connection)
+
+
+def Counts(pool):
+    """Return the number of connections and idle connections in the pool."""
+    return pool.numConnections[KEY], len(pool.idleConnections[KEY])
+
+
+def AssertTimesOut(pool, **kwargs):
+    """Assert that acquiring a connection times out."""
+    try:
+        pool.Acquire(*KEY, **kwargs)
+    except cx_OracleEx.PoolTimeout:
+        pass
+    else:
+        raise AssertionError("connection acquired from full pool")
+
+
+# the pool is filled to the minimum on first use and limited to the maximum
+pool = Pool(2, 3)
+first = pool.Acquire(*KEY)
+assert Connection.numConnects == 2 and Counts(pool) == (2, 1)
+second = pool.Acquire(*KEY)
+third = pool.Acquire(*KEY)
+assert Connection.numConnects == 3 and Counts(pool) == (3, 0)
+startTime = time.monotonic()
+AssertTimesOut(pool)
+assert time.monotonic() - startTime >= 0.05
+AssertTimesOut(pool, timeout = 0)
+pool.Release(second)
+assert pool.Acquire(*KEY) is second
+
+# a timeout of None waits until a connection is released
+acquired = []
+thread = threading.Thread(target = lambda: acquired.append(
+        pool.Acquire(*KEY, timeout = None)))
+thread.start()
+time.sleep(0.1)
+assert not acquired
+pool.Release(first)
+thread.join()
+assert acquired == [first]
+
+# an unhealthy connection is replaced when it is acquired
+pool.healthCheckInterval = 0
+third.unhealthy = True
+pool.Release(third)
+fourth = pool.Acquire(*KEY)
+assert third.closed and fourth is not third and Counts(pool) == (3, 0)
+
+# a session whose reset fails is discarded and its slot released
+fourth.resetFails = True
+pool.Release(fourth)
+assert fourth.closed and Counts(pool) == (2, 0)
+fifth = pool.Acquire(*KEY)
+assert Connection.numConnects == 5 and Counts(pool) == (3, 0)
+
+# the pool is refilled to the minimum once sessions have been discarded
+for connection in (first, second, fifth):
+    connection.resetFails = True
+    pool.Release(connection)
+assert Counts(pool) == (0, 0)
+pool.Acquire(*KEY)
+assert Connection.numConnects == 7 and Counts(pool) == (2, 1)
+
+# the slots reserved for connections which cannot be established are released
+for failAt, counts in ((1, (0, 0)), (2, (1, 1)), (3, (2, 2))):
+    pool = Pool(3, 3, failAt = [failAt])
+    try:
+        pool.Acquire(*KEY)
+    except cx_Oracle.DatabaseError:
+        pass
+    else:
+        raise AssertionError("failed connection acquired")
+    assert Counts(pool) == counts, failAt
+    Connection.failAt = set()
+    connections = [pool.Acquire(*KEY) for i in range(3)]
+    assert Counts(pool) == (3, 0)
+    AssertTimesOut(pool)
+    pool.Release(connections[0])
+    pool.Close()
+    assert connections[0].closed and Counts(pool) == (2, 0)
+print("All connections were acquired and released within the pool limits.")
@@ -0,0 +1,103 @@
+"""Check that the differences between the tables in two export files are
+   found, whether or not the files have an index. The export files are
+   written from a stand in cursor so that no database is required."""
+
+import cx_DiffData
+import cx_ExportData
+import cx_ImportData
+import cx_Oracle
+import FakeDatabase
+import io
+import os
+import tempfile
+
+DESCRIPTION = [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0),
+               ("NAME", cx_Oracle.STRING, 30, 30, 0, 0, 1)]
+OTHER_DESCRIPTION = [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0)]
+
+OLD_TABLES = {
+    "A" : [(str(i), "a%d" % i) for i in range(30)],
+    "B" : [("1", "b1"), ("2", None)],
+    "IGNORED" : [("1", "x")]
+}
+NEW_NAMES = { 3 : "changed", 7 : None }
+NEW_TABLES = {
+    "A" : [(str(i), NEW_NAMES.get(i, "a%d" % i)) for i in range(30) \
+            if i != 5] + [("99", "new")],
+    "C" : [("7", "c7")],
+    "IGNORED" : [("2", "y")],
+    "RENAMED" : OLD_TABLES["B"][:1]
+}
+
+KEY_COLUMNS = dict(A = ["ID"], B = ["ID"], C = ["ID"])
+
+EXPECTED = set([
+    ("A", cx_DiffData.UPDATE, ("3",), ("3", "a3"), ("3", "changed")),
+    ("A", cx_DiffData.UPDATE, ("7",), ("7", "a7"), ("7", None)),
+    ("A", cx_DiffData.DELETE, ("5",), ("5", "a5"), None),
+    ("A", cx_DiffData.INSERT, ("99",), None, ("99", "new")),
+    ("B", cx_DiffData.DELETE, ("1",), ("1", "b1"), None),
+    ("B", cx_DiffData.DELETE, ("2",), ("2", None), None),
+    ("C", cx_DiffData.INSERT, ("7",), None, ("7", "c7"))
+])
+
+
+def Export(fileName, tables, columnar, indexed,
+        description = DESCRIPTION):
+    """Export the tables to the file, with an index if requested."""
+    cursor = FakeDatabase.ExportCursor(dict((n, (description, r)) \
+            for n, r in tables.items()))
+    outFile = io.BytesIO() if indexed else FakeDatabase.UnseekableFile()
+    exporter = cx_ExportData.Exporter(outFile, cursor, None,
+            columnar = columnar)
+    for tableName in sorted(cursor.tables):
+        exporter.ExportTable(tableName)
+    exporter.FinalizeExport()
+    with open(fileName, "wb") as f:
+        f.write(outFile.getvalue())
+
+
+# the worker processes comparing the partitions are spawned and import this
+# module so the comparison itself must only be run from the main process
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as dirName:
+        oldFileName = os.path.join(dirName, "old.dat")
+        newFileName = os.path.join(dirName, "new.dat")
+        for columnar, indexed in ((True, True), (False, False),
+                (True, False)):
+            Export(oldFileName, OLD_TABLES, columnar, indexed)
+            Export(newFileName, NEW_TABLES, not columnar,
+                    not indexed)
+            differ = cx_DiffData.Differ(oldFileName, newFileName,
+                    numPartitions = 3, numWorkers = 2, tempDir = dirName)
+            changes = list(differ.DiffFiles(KEY_COLUMNS))
+            assert len(changes) == len(EXPECTED)
+            assert set(changes) == EXPECTED, (columnar, indexed)
+
+            # a table compared with a table of another name
+            changes = list(differ.DiffTable("B", ["ID"], "RENAMED"))
+            assert changes == [(cx_DiffData.DELETE, ("2",), ("2", None),
+                    None)]
+            assert differ.counts == { cx_DiffData.INSERT : 0,
+                    cx_DiffData.UPDATE : 0, cx_DiffData.DELETE : 1 }
+
+        # tables whose columns differ cannot be compared
+        Export(newFileName, NEW_TABLES, True, True, OTHER_DESCRIPTION)
+        differ = cx_DiffData.Differ(oldFileName, newFileName,
+                numPartitions = 2, numWorkers = 1, tempDir = dirName)
+        try:
+            list(differ.DiffTable("A", ["ID"]))
+        except cx_DiffData.ColumnsDiffer:
+            pass
+        else:
+            raise AssertionError("tables with different columns compared")
+
+        # key columns which are not in the table are reported
+        try:
+            list(differ.DiffTable("B", ["MISSING"]))
+        except cx_ImportData.ColumnNotFound:
+            pass
+        else:
+            raise AssertionError("missing key column found")
+        assert sorted(os.listdir(dirName)) == ["new.dat", "old.dat"]
+    print("All differences between the files were found.")
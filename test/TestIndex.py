@@ -0,0 +1,116 @@
+"""Check that the index written at the end of export files (and of each of the
+   segments listed in a manifest) is used to list the tables, to seek to a
+   table and to skip a table. The export files are written from a stand in
+   cursor so that no database is required."""
+
+import cx_ExportData
+import cx_ImportData
+import cx_Oracle
+import FakeDatabase
+import os
+import pickle
+import tempfile
+
+DESCRIPTION = [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0),
+               ("NAME", cx_Oracle.STRING, 30, 30, 0, 0, 1)]
+TABLES = {
+    "A" : [(str(i), "a%d" % i) for i in range(23)],
+    "B" : [(str(i), None) for i in range(7)],
+    "C" : [(str(i), "c%d" % i) for i in range(11)]
+}
+EXPORT_CURSOR = FakeDatabase.ExportCursor(dict((n, (DESCRIPTION, r)) \
+        for n, r in TABLES.items()))
+
+
+def Export(outFile, columnar, tables):
+    """Export the tables (a list of table name, rows to skip and row limit
+       tuples) to the file."""
+    exporter = cx_ExportData.Exporter(outFile, EXPORT_CURSOR, None,
+            columnar = columnar)
+    for tableName, rowsToSkip, rowLimit in tables:
+        exporter.ExportTable(tableName, rowsToSkip, rowLimit)
+    exporter.FinalizeExport()
+
+
+def CheckSkip(importer, fileName, tableNames):
+    """Check that skipping every table but the last leaves the importer
+       positioned at the last table."""
+    importer.OpenFile(fileName)
+    for tableName in tableNames[:-1]:
+        assert next(importer)[0] == tableName
+        importer.SkipTable()
+    assert next(importer)[0] == tableNames[-1]
+    assert importer.DataInTable() == TABLES[tableNames[-1]]
+    try:
+        next(importer)
+    except StopIteration:
+        pass
+    else:
+        raise AssertionError("table found after the last table")
+
+
+with tempfile.TemporaryDirectory() as dirName:
+    tableNames = ["A", "B", "C"]
+    fileName = os.path.join(dirName, "export.dat")
+    for columnar in (False, True):
+        for useMmap in (False, True):
+            importer = cx_ImportData.Importer(FakeDatabase.ImportConnection())
+            importer.useMmap = useMmap
+
+            # a file with an index
+            with open(fileName, "wb") as outFile:
+                Export(outFile, columnar,
+                        [(n, None, None) for n in tableNames])
+            importer.OpenFile(fileName)
+            assert importer.Tables() == \
+                    [(n, len(TABLES[n])) for n in tableNames]
+            for tableName in ("C", "A", "B"):
+                assert importer.SeekTable(tableName)[0] == tableName
+                assert importer.DataInTable() == TABLES[tableName]
+            try:
+                importer.SeekTable("D")
+            except cx_ImportData.TableNotFound:
+                pass
+            else:
+                raise AssertionError("missing table found")
+            CheckSkip(importer, fileName, tableNames)
+
+            # a file written to a stream cannot be indexed
+            outFile = FakeDatabase.UnseekableFile()
+            Export(outFile, columnar, [(n, None, None) for n in tableNames])
+            with open(fileName, "wb") as f:
+                f.write(outFile.getvalue())
+            importer.OpenFile(fileName)
+            try:
+                importer.Tables()
+            except cx_ImportData.IndexNotFound:
+                pass
+            else:
+                raise AssertionError("index found in unseekable file")
+            CheckSkip(importer, fileName, tableNames)
+
+            # a manifest listing segments, one of the tables in two chunks
+            segments = [("export.1", "A", 1, 0, 10),
+                        ("export.2", "A", 2, 10, None),
+                        ("export.3", "B", 1, 0, None)]
+            for segmentFileName, tableName, chunkNum, rowsToSkip, rowLimit \
+                    in segments:
+                with open(os.path.join(dirName, segmentFileName),
+                        "wb") as outFile:
+                    Export(outFile, columnar,
+                            [(tableName, rowsToSkip, rowLimit)])
+            manifestFileName = os.path.join(dirName, "export")
+            header = dict(format = cx_ExportData.FORMAT_NAME,
+                    version = cx_ExportData.FORMAT_VERSION,
+                    segments = [(f, t, c) for f, t, c, s, l in segments])
+            with open(manifestFileName, "wb") as outFile:
+                pickle.dump(header, outFile, cx_ExportData.BINARY)
+            importer.OpenFile(manifestFileName)
+            assert importer.Tables() == [("A", 23), ("B", 7)]
+            assert importer.SeekTable("B")[0] == "B"
+            assert importer.DataInTable() == TABLES["B"]
+            assert importer.SeekTable("A")[0] == "A"
+            assert importer.DataInTable() == TABLES["A"]
+            CheckSkip(importer, manifestFileName, ["A", "B"])
+            importer.Close()
+print("All tables were found and skipped using the index.")
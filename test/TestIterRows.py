@@ -0,0 +1,78 @@
+"""Check that the rows of a table are returned by IterRows() with the columns
+   requested, restricted by the filters given and in batches of the size
+   given. The export file is written from a stand in cursor so that no
+   database is required."""
+
+import cx_ExportData
+import cx_ImportData
+import cx_Oracle
+import FakeDatabase
+import itertools
+import os
+import tempfile
+
+DESCRIPTION = [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0),
+               ("NAME", cx_Oracle.STRING, 30, 30, 0, 0, 1),
+               ("CODE", cx_Oracle.STRING, 1, 1, 0, 0, 1)]
+ROWS = [(str(i), None if i % 5 == 0 else "n%d" % i, "XYZ"[i % 3]) \
+        for i in range(40)]
+
+
+def IsEven(value):
+    return int(value) % 2 == 0
+
+
+def IsX(value):
+    return value == "X"
+
+
+def Expected(columnNames, filters):
+    """Return the rows expected from IterRows()."""
+    names = [d[0] for d in DESCRIPTION]
+    rows = [r for r in ROWS \
+            if all(f(r[names.index(n)]) for n, f in filters.items())]
+    if columnNames is None:
+        return rows
+    indexes = [names.index(n) for n in columnNames]
+    return [tuple(r[i] for i in indexes) for r in rows]
+
+
+exportCursor = FakeDatabase.ExportCursor(dict(T = (DESCRIPTION, ROWS)),
+        arraysize = 6)
+with tempfile.TemporaryDirectory() as dirName:
+    fileName = os.path.join(dirName, "export.dat")
+    projections = (None, ["NAME"], ["CODE", "ID"])
+    filterSets = ({}, dict(ID = IsEven), dict(ID = IsEven, CODE = IsX),
+            dict(CODE = lambda v: False))
+    for columnar, codec in ((False, None), (True, None), (True, "zlib")):
+        with open(fileName, "wb") as outFile:
+            exporter = cx_ExportData.Exporter(outFile, exportCursor, None,
+                    columnar = columnar, codec = codec)
+            exporter.ExportTable("T")
+            exporter.FinalizeExport()
+        importer = cx_ImportData.Importer(FakeDatabase.ImportConnection())
+        for columnNames, filters in itertools.product(projections,
+                filterSets):
+            expected = Expected(columnNames, filters)
+            importer.OpenFile(fileName)
+            next(importer)
+            rows = importer.IterRows(columnNames, filters)
+            assert iter(rows) is rows
+            assert list(rows) == expected, (columnar, codec, columnNames)
+            importer.OpenFile(fileName)
+            next(importer)
+            batches = list(importer.IterRows(columnNames, filters,
+                    batchSize = 7))
+            assert [r for b in batches for r in b] == expected
+            assert all(len(b) == 7 for b in batches[:-1])
+            assert all(0 < len(b) <= 7 for b in batches)
+        importer.OpenFile(fileName)
+        next(importer)
+        try:
+            importer.IterRows(["MISSING"])
+        except cx_ImportData.ColumnNotFound:
+            pass
+        else:
+            raise AssertionError("missing column found")
+        importer.Close()
+print("All rows were projected, filtered and batched as requested.")
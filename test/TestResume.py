@@ -0,0 +1,97 @@
+"""Check that an import resumed from a checkpoint more than once inserts each
+   row exactly once. The export file is written from and imported into stand
+   in cursors and connections so that no database is required; the import
+   fails after a given number of rows on each attempt."""
+
+import cx_ExportData
+import cx_ImportData
+import cx_Oracle
+import FakeDatabase
+import itertools
+import os
+import tempfile
+
+DESCRIPTION = [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0)]
+ROWS = [(str(i),) for i in range(10)]
+
+class ImportFailed(Exception):
+    pass
+
+
+class ImportCursor(FakeDatabase.ImportCursor):
+
+    def __init__(self, connection, failAt):
+        FakeDatabase.ImportCursor.__init__(self, connection)
+        self.failAt = failAt
+        self.numRows = 0
+
+    def executemany(self, sql, rows, **kwargs):
+        self.numRows += len(rows)
+        if self.failAt is not None and self.numRows > self.failAt:
+            raise ImportFailed()
+        FakeDatabase.ImportCursor.executemany(self, sql, rows, **kwargs)
+
+
+class Connection(FakeDatabase.ImportConnection):
+
+    def __init__(self, committedRows, failAt):
+        FakeDatabase.ImportConnection.__init__(self)
+        self.committedRows = committedRows
+        self.importCursor = ImportCursor(self, failAt)
+
+    def cursor(self):
+        return self.importCursor
+
+
+def Import(fileName, checkpointFileName, committedRows, failAt, resume,
+        adaptive, commitPoint):
+    """Import the file, resuming from the checkpoint if requested, and return
+       true if the import completed."""
+    connection = Connection(committedRows, failAt)
+    importer = cx_ImportData.Importer(connection)
+    importer.checkpointFileName = checkpointFileName
+    importer.commitPoint = commitPoint
+    importer.adaptiveBatchSize = adaptive
+    importer.minBatchSize = importer.maxBatchSize = 3
+    try:
+        if resume:
+            importer.ResumeFromCheckpoint()
+        else:
+            importer.OpenFile(fileName)
+            next(importer)
+        importer.ImportTable()
+    except ImportFailed:
+        return False
+    except StopIteration:
+        pass
+    finally:
+        importer.Close()
+    return True
+
+
+exportCursor = FakeDatabase.ExportCursor(dict(T = (DESCRIPTION, ROWS)))
+with tempfile.TemporaryDirectory() as dirName:
+    for columnar in (False, True):
+        fileName = os.path.join(dirName, "export.dat")
+        with open(fileName, "wb") as outFile:
+            exporter = cx_ExportData.Exporter(outFile, exportCursor, None,
+                    columnar = columnar)
+            exporter.ExportTable("T")
+            exporter.FinalizeExport()
+        checkpointFileName = fileName + ".checkpoint"
+        for adaptive, commitPoint in itertools.product((False, True),
+                (3, 4, None)):
+            for failures in itertools.product((None, 1, 2, 4, 5, 7),
+                    repeat = 3):
+                if os.path.exists(checkpointFileName):
+                    os.remove(checkpointFileName)
+                committedRows = []
+                resume = False
+                for failAt in failures + (None,):
+                    if Import(fileName, checkpointFileName, committedRows,
+                            failAt, resume, adaptive, commitPoint):
+                        break
+                    resume = True
+                assert committedRows == ROWS, (columnar, adaptive,
+                        commitPoint, failures, committedRows)
+print("All resumed imports inserted each row exactly once.")
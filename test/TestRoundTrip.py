@@ -0,0 +1,206 @@
+"""Check that the rows exported in each format (the original format, the
+   columnar format and the columnar format with each codec) are imported
+   unchanged, that streamed LOB values are imported into temporary LOBs and
+   that the column buffers written by the ColumnBufferExporter hold the
+   values exported. The export files are written from stand in cursors so
+   that no database is required."""
+
+import cx_ExportData
+import cx_ImportData
+import cx_Oracle
+import datetime
+import FakeDatabase
+import itertools
+import os
+import tempfile
+
+TABLES = {
+    "PEOPLE" : (
+        [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0),
+         ("NAME", cx_Oracle.STRING, 30, 30, 0, 0, 1),
+         ("PHOTO", cx_Oracle.BINARY, 10, 10, 0, 0, 1)],
+        [(str(i), None if i % 3 == 0 else "n\xe9%d" % i, bytes([i])) \
+                for i in range(23)]),
+    "EVENTS" : (
+        [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0),
+         ("WHEN", cx_Oracle.DATETIME, 23, 7, 0, 0, 1)],
+        [(str(i), datetime.datetime(2020, 1, 1 + i)) for i in range(7)]),
+    "EMPTY" : ([("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0)], [])
+}
+
+# numbers not fetched as strings, as returned by a cursor for which
+# numbersAsStrings has no effect
+INT_TABLES = dict((n, (d, [(int(r[0]),) + r[1:] for r in rows])) \
+        for n, (d, rows) in TABLES.items())
+
+# the rows of a table with LOB values streamed in chunks
+LOB_DESCRIPTION = [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0),
+                   ("BODY", cx_Oracle.CLOB, 4000, 4000, 0, 0, 1),
+                   ("IMAGE", cx_Oracle.BLOB, 4000, 4000, 0, 0, 1)]
+LOB_VALUES = [("1", "streamed in chunks", b"\x00\x01\x02\x03\x04"),
+              ("2", None, b"xy"),
+              ("3", "z", None)]
+
+# the rows of the tables exported as column buffers; numbers are fetched as
+# strings unless native numbers are requested and numbers which cannot be
+# stored in 64 bits without loss are always fetched as strings
+BUFFER_DESCRIPTION = [("ID", cx_Oracle.NUMBER, 10, 22, 10, 0, 0),
+                      ("AMOUNT", cx_Oracle.NUMBER, 12, 22, 10, 2, 1),
+                      ("TOTAL", cx_Oracle.NUMBER, 30, 22, 30, 0, 1),
+                      ("WHEN", cx_Oracle.DATETIME, 23, 7, 0, 0, 1),
+                      ("NAME", cx_Oracle.STRING, 30, 30, 0, 0, 1),
+                      ("PHOTO", cx_Oracle.BINARY, 10, 10, 0, 0, 1)]
+BUFFER_ROWS = [(i, None if i % 4 == 0 else i * 1.25,
+                None if i % 5 == 0 else str(10 ** 20 + i),
+                None if i % 3 == 0 else datetime.datetime(2020, 1, 1, i),
+                None if i % 2 == 0 else "n\xe9" * i,
+                None if i == 7 else bytes(range(i))) for i in range(11)]
+STRING_BUFFER_ROWS = [tuple(None if v is None else str(v) for v in r[:3]) \
+        + r[3:] for r in BUFFER_ROWS]
+BUFFER_KINDS = [cx_ExportData.BUFFER_INT64, cx_ExportData.BUFFER_FLOAT64,
+        cx_ExportData.BUFFER_STRING, cx_ExportData.BUFFER_DATETIME,
+        cx_ExportData.BUFFER_STRING, cx_ExportData.BUFFER_BINARY]
+
+
+def BufferValues(kind, buffers):
+    """Return the values stored in the buffers of a column."""
+    if "values" in buffers:
+        values = buffers["values"].tolist()
+        if kind == cx_ExportData.BUFFER_DATETIME:
+            values = [cx_ExportData.EPOCH + \
+                    datetime.timedelta(microseconds = v) for v in values]
+    else:
+        offsets = buffers["offsets"].tolist()
+        data = buffers["data"].tobytes()
+        assert len(offsets) == len(buffers["nulls"]) + 1
+        assert offsets[0] == 0 and offsets[-1] == len(data)
+        values = [data[s:e] for s, e in zip(offsets, offsets[1:])]
+        if kind == cx_ExportData.BUFFER_STRING:
+            values = [v.decode("utf-8") for v in values]
+    return [None if n else v for n, v in zip(buffers["nulls"], values)]
+
+
+def Export(fileName, tables, columnar, codec, pipelined):
+    """Export all of the tables to the file."""
+    cursor = FakeDatabase.ExportCursor(tables, arraysize = 5)
+    with open(fileName, "wb") as outFile:
+        exporter = cx_ExportData.Exporter(outFile, cursor, None,
+                columnar = columnar, codec = codec)
+        exporter.pipelined = pipelined
+        exporter.pipelineDepth = 1
+        for tableName in tables:
+            exporter.ExportTable(tableName)
+        exporter.FinalizeExport()
+
+
+def Import(fileName, useMmap):
+    """Return a dictionary of the rows imported from each table."""
+    importer = cx_ImportData.Importer(FakeDatabase.ImportConnection())
+    importer.useMmap = useMmap
+    importer.OpenFile(fileName)
+    tables = {}
+    for tableName, columnNames in importer:
+        tables[tableName] = importer.DataInTable()
+    importer.Close()
+    return tables
+
+
+with tempfile.TemporaryDirectory() as dirName:
+    fileName = os.path.join(dirName, "export.dat")
+    expected = dict((n, r) for n, (d, r) in TABLES.items())
+    for columnar, codec, pipelined, useMmap in itertools.product(
+            (False, True), (None, "zlib", "lzma"), (False, True),
+            (False, True)):
+        Export(fileName, TABLES, columnar, codec, pipelined)
+        tables = Import(fileName, useMmap)
+        assert tables == expected, (columnar, codec, pipelined, useMmap)
+
+    # numbers not returned as strings by the cursor are stored as strings in
+    # the columnar format
+    Export(fileName, INT_TABLES, True, "zlib", False)
+    assert Import(fileName, False) == expected
+
+    # a codec which is not registered is rejected
+    try:
+        cx_ExportData.Codec("unknown")
+    except cx_ExportData.UnknownCodec:
+        pass
+    else:
+        raise AssertionError("unknown codec accepted")
+
+    # LOB values streamed in chunks are written to temporary LOBs
+    lobRows = [tuple(v if i == 0 or v is None else FakeDatabase.Lob(v) \
+            for i, v in enumerate(r)) for r in LOB_VALUES]
+    lobCursor = FakeDatabase.ExportCursor(dict(DOCS = (LOB_DESCRIPTION,
+            lobRows)))
+    with open(fileName, "wb") as outFile:
+        exporter = cx_ExportData.Exporter(outFile, lobCursor, None)
+        exporter.lobChunkSize = 2
+        exporter.ExportTable("DOCS")
+        exporter.FinalizeExport()
+    connection = FakeDatabase.ImportConnection()
+    importer = cx_ImportData.Importer(connection)
+    importer.OpenFile(fileName)
+    assert next(importer)[0] == "DOCS"
+    assert importer.ImportTable() == len(LOB_VALUES)
+    importer.Close()
+    assert [tuple(v if i == 0 or v is None else v.value \
+            for i, v in enumerate(r)) for r in connection.committedRows] \
+            == LOB_VALUES
+    numLobs = sum(v is not None for r in LOB_VALUES for v in r[1:])
+    assert len([s for s in connection.statements \
+            if "dbms_lob.createtemporary" in s]) == numLobs
+
+    # LOB values cannot be streamed in the columnar format
+    with open(fileName, "wb") as outFile:
+        exporter = cx_ExportData.Exporter(outFile, lobCursor, None,
+                columnar = True)
+        exporter.lobChunkSize = 2
+        try:
+            exporter.ExportTable("DOCS")
+        except cx_ExportData.LobStreamingNotSupported:
+            pass
+        else:
+            raise AssertionError("LOB values streamed in columnar format")
+
+    # column buffers, with and without native numbers
+    for nativeNumbers, rows in ((True, BUFFER_ROWS),
+            (False, STRING_BUFFER_ROWS)):
+        tables = dict(MEASURES = (BUFFER_DESCRIPTION, rows),
+                EMPTY = (BUFFER_DESCRIPTION, []),
+                SINGLE = (BUFFER_DESCRIPTION, rows[1:2]))
+        cursor = FakeDatabase.ExportCursor(tables)
+        with open(fileName, "wb") as outFile:
+            exporter = cx_ExportData.ColumnBufferExporter(outFile, cursor,
+                    None, nativeNumbers = nativeNumbers)
+            for tableName in tables:
+                exporter.ExportTable(tableName)
+            exporter.FinalizeExport()
+        reader = cx_ImportData.ColumnBufferReader(fileName)
+        assert reader.Tables() == [(n, len(r)) for n, (d, r) in tables.items()]
+        for tableName, (description, tableRows) in tables.items():
+            columns = reader.Columns(tableName)
+            assert [c[0] for c in columns] == [d[0] for d in description]
+            kinds = [c[1] for c in columns]
+            if nativeNumbers:
+                assert kinds == BUFFER_KINDS
+            else:
+                assert kinds == [cx_ExportData.BUFFER_STRING] * 3 + \
+                        BUFFER_KINDS[3:]
+            values = [BufferValues(k, b) for n, k, b in columns]
+            assert list(zip(*values)) == tableRows, (nativeNumbers,
+                    tableName)
+            for name, kind, buffers in columns:
+                assert all(len(b) == len(tableRows) \
+                        for n, b in buffers.items() \
+                        if n in ("nulls", "values"))
+                for buffer in buffers.values():
+                    buffer.release()
+        try:
+            reader.Columns("MISSING")
+        except cx_ImportData.TableNotFound:
+            pass
+        else:
+            raise AssertionError("missing table found")
+        reader.Close()
+print("All exported rows were imported unchanged.")